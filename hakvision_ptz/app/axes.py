@@ -0,0 +1,57 @@
+# Achsen-Normalisierung für MOVE-Kommandos: eigenes Modul ohne Abhängigkeiten,
+# der heiße Pfad (gehaltener Joystick) läuft über den LRU-Cache.
+import functools
+
+__all__ = ("clamp", "normalize_axes")
+
+
+def clamp(v: int, mn: int, mx: int) -> int:
+    return mn if v < mn else mx if v > mx else v
+
+
+def _normalize_axes(raw: tuple, deadzone: int, speed: int | float | str, max_speed: int) -> tuple:
+    """
+    Normalizes (pan, tilt, zoom) in one pass. Each axis accepts:
+      - int in [-100..100]
+      - float in [-1.0..1.0] (auto scaled to -100..100)
+    Values inside the deadzone become 0. Small direction values (-1..1)
+    are additionally scaled by speed (clamped to 1..max_speed),
+    e.g. pan=1 speed=7 -> 70.
+    """
+    spd = clamp(int(speed), 1, max_speed)
+    out = []
+    for v in raw:
+        x: float
+        if isinstance(v, (int, float)):
+            x = v
+        else:
+            try:
+                x = float(v)
+            except Exception:
+                out.append(0)
+                continue
+
+        small = -1.0 <= x <= 1.0
+        # round() statt int(x ± 0.5): .5-Grenzfälle sollen sich nicht ändern
+        ax = int(round(x * 100.0 if small else x))
+        ax = -100 if ax < -100 else 100 if ax > 100 else ax
+
+        # deadzone (percentage based) as mask: bool → 0/1, no branch
+        ax *= abs(ax) >= deadzone
+        if small:
+            ax = int(round((ax / 100.0) * spd * 10))
+            ax = -100 if ax < -100 else 100 if ax > 100 else ax
+        out.append(ax)
+    return tuple(out)
+
+
+_normalize_axes_cached = functools.lru_cache(maxsize=256)(_normalize_axes)
+
+
+def normalize_axes(raw: tuple, deadzone: int, speed: int | float | str, max_speed: int) -> tuple:
+    # Joystick sends identical frames repeatedly → cache hit; JSON lists/dicts
+    # as axis values are unhashable and take the uncached path.
+    try:
+        return _normalize_axes_cached(raw, deadzone, speed, max_speed)
+    except TypeError:
+        return _normalize_axes(raw, deadzone, speed, max_speed)
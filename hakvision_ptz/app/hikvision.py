@@ -1,15 +1,148 @@
+import asyncio
 import logging
+import functools
 from dataclasses import dataclass
 import xml.etree.ElementTree as ET
 
 import httpx
 
+try:
+    from lxml import etree as _lxml
+except ImportError:  # stdlib fallback (z.B. lokale Entwicklung ohne lxml)
+    _lxml = None
+
 log = logging.getLogger("hakvision_ptz.isapi")
 
 _HIK_NS = {"h": "http://www.hikvision.com/ver20/XMLSchema"}
 
+# Zoom field name differs between models; order = preference
+_ZOOM_NAMES = ("zoom", "zoomLevel", "absoluteZoom", "zoomPos", "zoomPosition")
+_ZOOM_PRIO = {name.lower(): prio for prio, name in enumerate(_ZOOM_NAMES)}
+
+if _lxml is not None:
+    # Camera XML is parsed on every poll → C parser + precompiled XPath
+    # Reused for every poll; r.content (bytes) goes in directly, the XML
+    # declaration carries the encoding → no str decode/re-encode round-trip
+    _PARSER = _lxml.XMLParser(resolve_entities=False, remove_blank_text=True, huge_tree=False)
+    _XP_PAN = _lxml.XPath("/h:PTZStatus/h:AbsoluteHigh/h:azimuth/text()", namespaces=_HIK_NS)
+    _XP_TILT = _lxml.XPath("/h:PTZStatus/h:AbsoluteHigh/h:elevation/text()", namespaces=_HIK_NS)
+    _XP_ZOOM = _lxml.XPath("/h:PTZStatus/h:AbsoluteHigh/h:absoluteZoom/text()", namespaces=_HIK_NS)
+    _XP_PAN_ANY = _lxml.XPath("//h:azimuth/text()", namespaces=_HIK_NS)
+    _XP_TILT_ANY = _lxml.XPath("//h:elevation/text()", namespaces=_HIK_NS)
+
+# ElementTree fallback: fully qualified paths, no per-call prefix expansion
+_NS = "{" + _HIK_NS["h"] + "}"
+_P_PAN = f"./{_NS}AbsoluteHigh/{_NS}azimuth"
+_P_TILT = f"./{_NS}AbsoluteHigh/{_NS}elevation"
+_P_ZOOM = f"./{_NS}AbsoluteHigh/{_NS}absoluteZoom"
+_P_PAN_ANY = f".//{_NS}azimuth"
+_P_TILT_ANY = f".//{_NS}elevation"
+
+
+def _to_float(x):
+    try:
+        return float(x)
+    except Exception:
+        return None
+
+
+def _first_float(texts):
+    return _to_float(texts[0]) if texts else None
+
+
+def _pick_zoom(root):
+    """
+    Zoom field name differs between models → every element whose local name
+    contains "zoom" (any namespace, case-insensitive) is a candidate; well-known
+    names win, otherwise the first numeric candidate.
+    """
+    best = first = None
+    best_prio = None
+
+    # Single pass; lower prio value = preferred name
+    for elem in root.iter():
+        tag = elem.tag
+        if not isinstance(tag, str):  # lxml: comments / processing instructions
+            continue
+        name = tag.rpartition("}")[2]
+        lname = name.lower()
+        if "zoom" not in lname:
+            continue
+        z = _to_float((elem.text or "").strip())
+        if z is None:
+            continue
+        if first is None:
+            first = (name, z)
+        prio = _ZOOM_PRIO.get(lname)
+        if prio is not None and (best_prio is None or prio < best_prio):
+            best, best_prio = (name, z), prio
+
+    pick = best or first
+    if pick is None:
+        return None
+    log.debug("Zoom detected via %s", pick[0])
+    return pick[1]
+
+
+def _parse_ptz_status(body: bytes):
+    if _lxml is not None:
+        root = _lxml.fromstring(body, parser=_PARSER)
+
+        # Standard fields: PTZStatus/AbsoluteHigh/{azimuth,elevation,absoluteZoom}
+        pan = _first_float(_XP_PAN(root))
+        tilt = _first_float(_XP_TILT(root))
+        zoom = _first_float(_XP_ZOOM(root))
+
+        # Andere Verschachtelung (ältere Modelle) → Deep-Search nur wenn nötig
+        if pan is None:
+            pan = _first_float(_XP_PAN_ANY(root))
+        if tilt is None:
+            tilt = _first_float(_XP_TILT_ANY(root))
+        if zoom is None:
+            zoom = _pick_zoom(root)
+        return pan, tilt, zoom
+
+    root = ET.fromstring(body)
+
+    pan = _to_float(root.findtext(_P_PAN))
+    tilt = _to_float(root.findtext(_P_TILT))
+    zoom = _to_float(root.findtext(_P_ZOOM))
+
+    if pan is None:
+        pan = _to_float(root.findtext(_P_PAN_ANY))
+    if tilt is None:
+        tilt = _to_float(root.findtext(_P_TILT_ANY))
+    if zoom is None:
+        zoom = _pick_zoom(root)
+    return pan, tilt, zoom
+
+
+_MOVE_HEAD = (
+    b'<?xml version="1.0" encoding="UTF-8"?>\n'
+    b'<PTZData version="2.0" xmlns="http://www.hikvision.com/ver20/XMLSchema">\n'
+    b"  <pan>"
+)
+_MOVE_PAN_TILT = b"</pan>\n  <tilt>"
+_MOVE_TILT_ZOOM = b"</tilt>\n  <zoom>"
+_MOVE_TAIL = b"</zoom>\n</PTZData>"
+
+
+@functools.lru_cache(maxsize=256)
+def _build_move_body(pan: int, tilt: int, zoom: int) -> bytes:
+    # Joystick-Streams wiederholen dieselben Tripel ständig → fertige Bytes cachen
+    return b"".join((
+        _MOVE_HEAD, b"%d" % pan,
+        _MOVE_PAN_TILT, b"%d" % tilt,
+        _MOVE_TILT_ZOOM, b"%d" % zoom,
+        _MOVE_TAIL,
+    ))
+
+
+# Häufigster Befehl (Smooth-Stop, Joystick loslassen, duration_ms): fertig vorgebaut
+_STOP_XML_BYTES = _MOVE_HEAD + b"0" + _MOVE_PAN_TILT + b"0" + _MOVE_TILT_ZOOM + b"0" + _MOVE_TAIL
+
 
-@dataclass
+@dataclass(slots=True, frozen=True)
 class HikvisionConfig:
     host: str
     port: int
@@ -23,25 +156,60 @@ class HikvisionISAPI:
         self.cfg = cfg
         self.base = f"http://{cfg.host}:{cfg.port}"
         self.auth = httpx.DigestAuth(cfg.username, cfg.password)
+        # Channel is fixed at startup → build ISAPI paths once
+        ch = cfg.channel
+        self._path_continuous = f"/ISAPI/PTZCtrl/channels/{ch}/continuous"
+        self._path_status = f"/ISAPI/PTZCtrl/channels/{ch}/status"
+        self._path_preset_fmt = f"/ISAPI/PTZCtrl/channels/{ch}/presets/{{}}/goto"
+        self._log_debug = log.isEnabledFor(logging.DEBUG)
+
+        # Ein langlebiger Client: Keep-Alive Socket + Digest-Nonce werden
+        # über alle MOVE/STOP/STATUS Aufrufe hinweg wiederverwendet.
+        # Explizit HTTP/1.1 + keep-alive: viele Kameras kommen mit H2 nicht klar
+        # und schließen sonst den Socket nach jeder Antwort. Bei eigenem transport=
+        # ignoriert der Client http1/http2 → nur am Transport setzen.
+        self._client = httpx.AsyncClient(
+            auth=self.auth,
+            base_url=self.base,
+            timeout=5.0,
+            headers={"Connection": "keep-alive", "Content-Type": "application/xml"},
+            transport=httpx.AsyncHTTPTransport(
+                http1=True,
+                http2=False,
+                retries=1,
+                limits=httpx.Limits(
+                    max_keepalive_connections=2,
+                    max_connections=8,
+                    keepalive_expiry=120,
+                ),
+            ),
+        )
+        # Begrenzt parallele ISAPI Requests bei MQTT Command-Bursts
+        self._sem = asyncio.Semaphore(8)
+
+    async def aclose(self):
+        await self._client.aclose()
 
     # ---------------------------------------------------------------------
     # Connection Test
     # ---------------------------------------------------------------------
 
-    def test_connection(self):
-        url = f"{self.base}/ISAPI/System/status"
-        log.info("Testing Hikvision ISAPI connection to %s", url)
+    async def test_connection(self):
+        path = "/ISAPI/System/status"
+        log.info("Testing Hikvision ISAPI connection to %s%s", self.base, path)
         try:
-            with httpx.Client(auth=self.auth, timeout=5.0) as c:
-                r = c.get(url)
-                log.info("ISAPI status response: %s", r.status_code)
-
-                if r.status_code == 200:
-                    log.info("Hikvision connection OK")
-                elif r.status_code in (401, 403):
-                    log.error("Authentication failed (%s)", r.status_code)
-                else:
-                    log.error("Unexpected response from camera: %s", r.status_code)
+            # Läuft über den gemeinsamen Client: Digest-Handshake und Socket
+            # stehen danach schon, der erste MOVE zahlt keine Extra-RTTs.
+            async with self._sem:
+                r = await self._client.get(path)
+            log.info("ISAPI status response: %s", r.status_code)
+
+            if r.status_code == 200:
+                log.info("Hikvision connection OK")
+            elif r.status_code in (401, 403):
+                log.error("Authentication failed (%s)", r.status_code)
+            else:
+                log.error("Unexpected response from camera: %s", r.status_code)
 
         except Exception as e:
             log.exception("Failed to connect to Hikvision camera: %s", e)
@@ -50,78 +218,18 @@ class HikvisionISAPI:
     # PTZ Status (Pan / Tilt / Zoom)
     # ---------------------------------------------------------------------
 
-    def get_ptz_status(self) -> dict:
+    async def get_ptz_status(self) -> dict:
         """
         Reads PTZ status/position from the camera.
         Returns dict with pan/tilt/zoom as floats (if available).
         Zoom field name differs between models → robust fallback detection.
         """
 
-        url = f"{self.base}/ISAPI/PTZCtrl/channels/{self.cfg.channel}/status"
-
-        with httpx.Client(auth=self.auth, timeout=5.0) as c:
-            r = c.get(url)
-            r.raise_for_status()
-
-        root = ET.fromstring(r.text)
-
-        def to_float(x):
-            try:
-                return float(x)
-            except Exception:
-                return None
-
-        # Standard fields (most common Hikvision naming)
-        az = root.findtext(".//h:azimuth", default=None, namespaces=_HIK_NS)
-        el = root.findtext(".//h:elevation", default=None, namespaces=_HIK_NS)
-        zm = root.findtext(".//h:zoom", default=None, namespaces=_HIK_NS)
+        async with self._sem:
+            r = await self._client.get(self._path_status)
+        r.raise_for_status()
 
-        pan = to_float(az)
-        tilt = to_float(el)
-        zoom = to_float(zm)
-
-        # -----------------------------------------------------------------
-        # Zoom Fallback Detection (for models with different XML fields)
-        # -----------------------------------------------------------------
-        if zoom is None:
-            candidates = []
-
-            for elem in root.iter():
-                tag = elem.tag
-
-                # Remove namespace prefix {ns}
-                if isinstance(tag, str) and tag.startswith("{"):
-                    tag = tag.split("}", 1)[1]
-
-                if isinstance(tag, str) and "zoom" in tag.lower():
-                    val = (elem.text or "").strip()
-                    z = to_float(val)
-                    if z is not None:
-                        candidates.append((tag, z))
-
-            if candidates:
-                log.debug("Zoom candidates detected: %s", candidates)
-
-                preferred_names = [
-                    "zoom",
-                    "zoomLevel",
-                    "absoluteZoom",
-                    "zoomPos",
-                    "zoomPosition",
-                ]
-
-                # Prefer well-known names
-                for pref in preferred_names:
-                    for tag, value in candidates:
-                        if tag.lower() == pref.lower():
-                            zoom = value
-                            break
-                    if zoom is not None:
-                        break
-
-                # Fallback: first numeric candidate
-                if zoom is None:
-                    zoom = candidates[0][1]
+        pan, tilt, zoom = _parse_ptz_status(r.content)
 
         return {
             "pan": pan,
@@ -133,49 +241,36 @@ class HikvisionISAPI:
     # Internal PUT helper
     # ---------------------------------------------------------------------
 
-    def _put(self, path: str, body: str):
-        url = f"{self.base}{path}"
-
+    async def _put(self, path: str, body: bytes):
         try:
-            with httpx.Client(auth=self.auth, timeout=5.0) as c:
-                r = c.put(
-                    url,
-                    content=body.encode("utf-8"),
-                    headers={"Content-Type": "application/xml"},
-                )
+            async with self._sem:
+                r = await self._client.put(path, content=body)
 
-                log.info("ISAPI PUT %s → %s", path, r.status_code)
-                r.raise_for_status()
-                return r.text
+            # per-packet trace (joystick rate) → DEBUG
+            if self._log_debug:
+                log.debug("ISAPI PUT %s → %s", path, r.status_code)
+            r.raise_for_status()
+            return r.text
 
         except Exception as e:
-            log.exception("ISAPI request failed: %s", e)
+            # caller logs the traceback; transient "camera busy" errors are frequent
+            log.warning("ISAPI PUT %s failed: %s", path, e)
             raise
 
     # ---------------------------------------------------------------------
     # PTZ Movement
     # ---------------------------------------------------------------------
 
-    def continuous_move(self, pan: int, tilt: int, zoom: int):
-        path = f"/ISAPI/PTZCtrl/channels/{self.cfg.channel}/continuous"
-
-        xml = f"""<?xml version="1.0" encoding="UTF-8"?>
-<PTZData version="2.0" xmlns="http://www.hikvision.com/ver20/XMLSchema">
-  <pan>{pan}</pan>
-  <tilt>{tilt}</tilt>
-  <zoom>{zoom}</zoom>
-</PTZData>"""
-
-        return self._put(path, xml)
+    async def continuous_move(self, pan: int, tilt: int, zoom: int):
+        return await self._put(self._path_continuous, _build_move_body(pan, tilt, zoom))
 
-    def stop(self):
-        return self.continuous_move(0, 0, 0)
+    async def stop(self):
+        return await self._put(self._path_continuous, _STOP_XML_BYTES)
 
     # ---------------------------------------------------------------------
     # Presets
     # ---------------------------------------------------------------------
 
-    def goto_preset(self, preset_id: int):
-        path = f"/ISAPI/PTZCtrl/channels/{self.cfg.channel}/presets/{preset_id}/goto"
+    async def goto_preset(self, preset_id: int):
         # Many Hikvision devices accept an empty body here.
-        return self._put(path, "")
+        return await self._put(self._path_preset_fmt.format(preset_id), b"")
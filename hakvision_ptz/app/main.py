@@ -1,11 +1,18 @@
 import os
 import json
 import time
+import signal
+import asyncio
 import logging
-import threading
-from datetime import datetime, timezone
+from datetime import datetime
 from zoneinfo import ZoneInfo
 
+try:
+    import orjson
+except ImportError:  # stdlib fallback
+    orjson = None
+
+from app.axes import normalize_axes
 from app.mqtt_client import MqttConfig, MqttSubscriber
 from app.hikvision import HikvisionConfig, HikvisionISAPI
 
@@ -13,51 +20,82 @@ log = logging.getLogger("hakvision_ptz")
 
 TZ_LOCAL = ZoneInfo("Europe/Berlin")
 
+# Status polling slows down after this long without motion
+STATUS_IDLE_AFTER_MS = 2000
+# Polled positions closer than this to the last published one are not re-published
+POS_DEADBAND = 0.5
+# MOVE PUTs go out at most every 50ms (20 Hz); newer MOVEs replace waiting ones
+MOVE_MIN_INTERVAL_MS = 50
 
-def clamp(v: int, mn: int, mx: int) -> int:
-    return mn if v < mn else mx if v > mx else v
 
+def _pos_changed(old, new, deadband: float) -> bool:
+    if old is None:
+        return True
+    for a, b in zip(old, new):
+        if a is None or b is None:
+            if a is not b:
+                return True
+        elif abs(a - b) > deadband:
+            return True
+    return False
 
-def axis_to_100(value) -> int:
-    """
-    Accepts:
-      - int in [-100..100]
-      - float in [-1.0..1.0] (auto scaled to -100..100)
-    """
-    try:
-        x = float(value)
-    except Exception:
-        return 0
 
-    # If normalized float
-    if -1.0 <= x <= 1.0:
-        x = x * 100.0
+def json_dumps(obj) -> bytes:
+    # paho publishes bytes as-is → no extra str → UTF-8 encode
+    if orjson is not None:
+        return orjson.dumps(obj)
+    return json.dumps(obj, separators=(",", ":")).encode("utf-8")
+
 
-    return clamp(int(round(x)), -100, 100)
+_OPTS: dict | None = None
 
 
 def load_options() -> dict:
-    with open("/data/options.json", "r", encoding="utf-8") as f:
-        return json.load(f)
+    # Einmal lesen; spätere Aufrufe (z.B. Reload) bekommen dasselbe Dict
+    global _OPTS
+    if _OPTS is None:
+        with open("/data/options.json", "rb") as f:
+            raw = f.read()
+        _OPTS = orjson.loads(raw) if orjson is not None else json.loads(raw)
+    return _OPTS
+
+
+# UTC-Offset von TZ_LOCAL, wird stündlich neu bestimmt (DST-Wechsel liegen auf vollen Stunden)
+_tz_offset = (0, "+00:00", 0)  # (offset_sec, suffix, gültig bis epoch-sec)
+
+
+def _local_offset(sec: int):
+    global _tz_offset
+    if not _tz_offset[2] - 3600 <= sec < _tz_offset[2]:
+        off = int(datetime.fromtimestamp(sec, TZ_LOCAL).utcoffset().total_seconds())
+        sign = "-" if off < 0 else "+"
+        h, m = divmod(abs(off) // 60, 60)
+        _tz_offset = (off, "%s%02d:%02d" % (sign, h, m), sec - sec % 3600 + 3600)
+    return _tz_offset
 
 
 def ts_now():
-    dt_utc = datetime.now(timezone.utc)
-    dt_loc = dt_utc.astimezone(TZ_LOCAL)
+    sec, rem = divmod(time.time_ns(), 1_000_000_000)
+    ms = rem // 1_000_000
+    off, suffix, _ = _local_offset(sec)
     return (
-        dt_utc.isoformat(timespec="milliseconds").replace("+00:00", "Z"),
-        dt_loc.isoformat(timespec="milliseconds"),
+        "%s.%03dZ" % (time.strftime("%Y-%m-%dT%H:%M:%S", time.gmtime(sec)), ms),
+        "%s.%03d%s" % (time.strftime("%Y-%m-%dT%H:%M:%S", time.gmtime(sec + off)), ms, suffix),
     )
 
 
-def main():
+async def amain():
     opt = load_options()
 
     logging.basicConfig(
         level=opt.get("log_level", "INFO"),
         format="%(asctime)s %(levelname)s:%(name)s:%(message)s",
         datefmt="%Y-%m-%d %H:%M:%S",
+        force=True,
     )
+    # Level kommt aus options.json und ändert sich zur Laufzeit nicht →
+    # Per-Message DEBUG-Logs einmal hier entscheiden statt pro Aufruf
+    log_debug = log.isEnabledFor(logging.DEBUG)
 
     # HTTP Spam reduzieren
     logging.getLogger("httpx").setLevel(logging.WARNING)
@@ -86,21 +124,109 @@ def main():
     max_speed = int(opt.get("max_speed", 10))
     smooth_stop_ms = int(opt.get("smooth_stop_ms", 300))
     status_poll_ms = int(opt.get("status_poll_ms", 500))
+    # Zeitvergleiche laufen in Integer-Nanosekunden (time.monotonic_ns)
+    move_min_interval_ns = MOVE_MIN_INTERVAL_MS * 1_000_000
+    status_idle_after_ns = STATUS_IDLE_AFTER_MS * 1_000_000
 
-    hik = HikvisionISAPI(hik_cfg)
-    hik.test_connection()
+    loop = asyncio.get_running_loop()
+    stop_event = asyncio.Event()
+    for sig in ("SIGTERM", "SIGINT"):
+        try:
+            loop.add_signal_handler(getattr(signal, sig), stop_event.set)
+        except Exception:
+            pass
 
-    last_move_ts = 0.0
+    hik = HikvisionISAPI(hik_cfg)
+    await hik.test_connection()
+
+    # Pending stop (smooth-stop or duration_ms); re-armed by every MOVE
+    stop_timer: asyncio.TimerHandle | None = None
+    # Referenzen auf laufende Hintergrund-Tasks (sonst räumt der GC sie ab)
+    bg_tasks: set[asyncio.Task] = set()
+
+    def spawn(coro):
+        task = asyncio.create_task(coro)
+        bg_tasks.add(task)
+        task.add_done_callback(bg_tasks.discard)
+        return task
+
+    # Last command sent to the camera (dedupe repeated joystick frames)
+    last_triple = (0, 0, 0)
+    last_sent_ns = 0
+
+    # Motion tracking for the status poller (commands + observed position changes)
+    last_motion_ns = 0
+    last_pos = None
+    poll_wake = asyncio.Event()
+
+    def note_motion():
+        nonlocal last_motion_ns
+        last_motion_ns = time.monotonic_ns()
+        poll_wake.set()
+
+    # Camera commands go out one at a time in arrival order (FIFO lock);
+    # a MOVE still waiting (lock or rate limit) when a newer MOVE arrives is dropped.
+    cmd_lock = asyncio.Lock()
+    move_seq = 0
+
+    async def send_move(pan: int, tilt: int, zoom: int, seq: int) -> bool:
+        nonlocal last_triple, last_sent_ns
+        async with cmd_lock:
+            if seq != move_seq:
+                log.debug("MOVE superseded by newer MOVE, dropped")
+                return False
+            triple = (pan, tilt, zoom)
+            # Same command as the camera already runs → skip before rate limiting;
+            # a held joystick keeps moving via the re-armed smooth-stop timer
+            if triple == last_triple:
+                log.debug("MOVE unchanged, skipped")
+                return False
+            since_ns = time.monotonic_ns() - last_sent_ns
+            if since_ns < move_min_interval_ns:
+                # Rate limit; whatever arrives meanwhile supersedes this MOVE
+                await asyncio.sleep((move_min_interval_ns - since_ns) / 1e9)
+                if seq != move_seq:
+                    log.debug("MOVE superseded by newer MOVE, dropped")
+                    return False
+            try:
+                await hik.continuous_move(pan, tilt, zoom)
+            except Exception:
+                # Camera state unknown → next MOVE/STOP must not be deduplicated
+                last_triple = None
+                raise
+            last_triple, last_sent_ns = triple, time.monotonic_ns()
+        note_motion()
+        return True
+
+    async def send_stop():
+        nonlocal last_triple, last_sent_ns
+        async with cmd_lock:
+            try:
+                await hik.stop()
+            except Exception:
+                last_triple = None
+                raise
+            last_triple, last_sent_ns = (0, 0, 0), time.monotonic_ns()
+        note_motion()
 
     # Subscriber must exist before we can publish status from handle()
     subscriber = None  # will be set below
     status_topic = f"{mqtt_cfg.topic_prefix}/{mqtt_cfg.camera_id}/status/position"
 
-    def publish_position(source: str):
-        nonlocal subscriber
-        if subscriber is None:
+    async def publish_position(source: str):
+        nonlocal last_pos
+        # MQTT down (e.g. reconnecting) → skip the ISAPI GET entirely
+        if subscriber is None or not subscriber.connected.is_set():
+            return
+        st = await hik.get_ptz_status()
+        pos = (st.get("pan"), st.get("tilt"), st.get("zoom"))
+        changed = _pos_changed(last_pos, pos, POS_DEADBAND)
+        if changed:
+            note_motion()
+        elif source == "poll":
+            # Camera still → no retained-message churn
             return
-        st = hik.get_ptz_status()
+        last_pos = pos
         ts_utc, ts_local = ts_now()
         payload = {
             "ts_utc": ts_utc,
@@ -110,132 +236,166 @@ def main():
             "tilt": st.get("tilt"),
             "zoom": st.get("zoom"),
         }
-        subscriber.publish(status_topic, json.dumps(payload), retain=True, qos=0)
-        log.debug("STATUS published to %s (source=%s)", status_topic, source)
+        subscriber.publish(status_topic, json_dumps(payload), retain=True, qos=0)
+        if log_debug:
+            log.debug("STATUS published to %s (source=%s)", status_topic, source)
+
+    async def do_move(data: dict):
+        nonlocal move_seq
+        move_seq += 1
+        seq = move_seq
+
+        # Optional speed multiplier for button-style commands; parsing and
+        # clamping happen inside the cached normalize_axes
+        speed = data.get("speed", default_speed)
+
+        pan, tilt, zoom = normalize_axes(
+            (data.get("pan", 0), data.get("tilt", 0), data.get("zoom", 0)),
+            deadzone,
+            speed,
+            max_speed,
+        )
+
+        duration_ms = int(data.get("duration_ms", 0))
+
+        sent = await send_move(pan, tilt, zoom, seq)
+        # Superseded by a newer MOVE → that one arms its own stop
+        if seq != move_seq:
+            return
 
-    def handle(topic: str, data: dict, ts: float):
-        nonlocal last_move_ts
+        # Arm the stop right away; the status GET below must not delay it
+        if duration_ms > 0:
+            arm_stop(duration_ms, "MOVE stop")
+        else:
+            arm_stop(smooth_stop_ms, "Smooth-stop")
 
-        action = topic.split("/")[-1]
+        if sent:
+            if log_debug:
+                log.debug("MOVE pan=%s tilt=%s zoom=%s", pan, tilt, zoom)
 
+            # Immediately publish position after command (best-effort)
+            try:
+                await publish_position("after_cmd")
+            except Exception:
+                log.exception("Failed to publish status after move")
+
+    async def do_stop(data: dict):
+        disarm_stop()
+        await send_stop()
+        log.info("STOP")
+        try:
+            await publish_position("after_cmd")
+        except Exception:
+            log.exception("Failed to publish status after stop")
+
+    async def do_preset(data: dict):
+        nonlocal last_triple
+        preset = int(data.get("preset"))
+        # A pending smooth-stop would otherwise abort the preset travel
+        disarm_stop()
+        async with cmd_lock:
+            # Camera travels to the preset → last MOVE/STOP no longer describes
+            # its state, the next MOVE or release must go out
+            last_triple = None
+            await hik.goto_preset(preset)
+        note_motion()
+        log.info("PRESET goto %s", preset)
         try:
-            if action == "move":
-                raw_pan = data.get("pan", 0)
-                raw_tilt = data.get("tilt", 0)
-                raw_zoom = data.get("zoom", 0)
-
-                pan = axis_to_100(raw_pan)
-                tilt = axis_to_100(raw_tilt)
-                zoom = axis_to_100(raw_zoom)
-
-                # deadzone (now percentage based)
-                if abs(pan) < deadzone:
-                    pan = 0
-                if abs(tilt) < deadzone:
-                    tilt = 0
-                if abs(zoom) < deadzone:
-                    zoom = 0
-
-                # Optional speed multiplier for button-style commands
-                speed = int(data.get("speed", default_speed))
-                speed = clamp(speed, 1, max_speed)
-
-                # If small direction values were sent (-1..1)
-                # Example: pan=1 speed=7 -> 70
-                if abs(float(raw_pan)) <= 1.0 and pan != 0:
-                    pan = clamp(int(round((pan / 100.0) * speed * 10)), -100, 100)
-                if abs(float(raw_tilt)) <= 1.0 and tilt != 0:
-                    tilt = clamp(int(round((tilt / 100.0) * speed * 10)), -100, 100)
-                if abs(float(raw_zoom)) <= 1.0 and zoom != 0:
-                    zoom = clamp(int(round((zoom / 100.0) * speed * 10)), -100, 100)
-
-                hik.continuous_move(pan, tilt, zoom)
-                log.info("MOVE pan=%s tilt=%s zoom=%s", pan, tilt, zoom)
-
-                # Immediately publish position after command (best-effort)
-                try:
-                    publish_position("after_cmd")
-                except Exception:
-                    log.exception("Failed to publish status after move")
-
-                duration_ms = int(data.get("duration_ms", 0))
-
-                if duration_ms > 0:
-                    def _stop_later():
-                        time.sleep(duration_ms / 1000.0)
-                        try:
-                            hik.stop()
-                            log.info("MOVE stop after %sms", duration_ms)
-                            try:
-                                publish_position("after_cmd")
-                            except Exception:
-                                log.exception("Failed to publish status after stop")
-                        except Exception:
-                            log.exception("MOVE stop failed")
-
-                    threading.Thread(target=_stop_later, daemon=True).start()
-                else:
-                    last_move_ts = ts
-
-            elif action == "stop":
-                hik.stop()
-                log.info("STOP")
-                try:
-                    publish_position("after_cmd")
-                except Exception:
-                    log.exception("Failed to publish status after stop")
-
-            elif action == "preset":
-                preset = int(data.get("preset"))
-                hik.goto_preset(preset)
-                log.info("PRESET goto %s", preset)
-                try:
-                    publish_position("after_cmd")
-                except Exception:
-                    log.exception("Failed to publish status after preset")
-
-            else:
-                log.warning("Unknown action: %s payload=%s", topic, data)
+            await publish_position("after_cmd")
+        except Exception:
+            log.exception("Failed to publish status after preset")
+
+    # Keyed by the full command topic: one dict lookup, no slicing per message
+    cmd_base = f"{mqtt_cfg.topic_prefix}/{mqtt_cfg.camera_id}/cmd/"
+    actions = {cmd_base + name: fn for name, fn in (
+        ("move", do_move), ("stop", do_stop), ("preset", do_preset),
+    )}
+
+    async def handle(topic: str, data: dict):
+        fn = actions.get(topic)
+        if fn is None:
+            log.warning("Unknown action: %s payload=%s", topic, data)
+            return
 
+        try:
+            await fn(data)
         except Exception:
             log.exception("Error handling topic=%s payload=%s", topic, data)
 
-    def watchdog():
-        nonlocal last_move_ts
-        while True:
-            time.sleep(0.05)
-            if last_move_ts and (time.time() - last_move_ts) * 1000 > smooth_stop_ms:
-                try:
-                    hik.stop()
-                    log.info("Smooth-stop after %sms", smooth_stop_ms)
-                    try:
-                        publish_position("after_cmd")
-                    except Exception:
-                        log.exception("Failed to publish status after smooth-stop")
-                except Exception:
-                    log.exception("Smooth-stop failed")
-                last_move_ts = 0.0
-
-    def status_poller():
+    async def delayed_stop(reason: str, delay_ms: int):
+        # Camera already received a stop (e.g. joystick released with 0/0/0)
+        if last_triple == (0, 0, 0):
+            return
+        try:
+            await send_stop()
+            log.info("%s after %sms", reason, delay_ms)
+            try:
+                await publish_position("after_cmd")
+            except Exception:
+                log.exception("Failed to publish status after %s", reason)
+        except Exception:
+            log.exception("%s failed", reason)
+
+    def arm_stop(delay_ms: int, reason: str):
+        # Single pending stop: every MOVE (smooth or duration_ms) replaces it
+        nonlocal stop_timer
+        if stop_timer is not None:
+            stop_timer.cancel()
+        stop_timer = loop.call_later(
+            delay_ms / 1000.0, lambda: spawn(delayed_stop(reason, delay_ms))
+        )
+
+    def disarm_stop():
+        nonlocal stop_timer
+        if stop_timer is not None:
+            stop_timer.cancel()
+            stop_timer = None
+
+    async def status_poller():
         # Wait until MQTT is connected, then publish regularly
-        if subscriber and not subscriber.connected.wait(timeout=30):
+        try:
+            await asyncio.wait_for(subscriber.connected.wait(), timeout=30)
+        except asyncio.TimeoutError:
             log.warning("MQTT not connected after 30s, status poller will still try.")
+        poll_ms = max(50, status_poll_ms)
+        idle_poll_ms = max(poll_ms, min(5000, poll_ms * 8))
         while True:
             try:
-                publish_position("poll")
+                await publish_position("poll")
             except Exception:
                 log.exception("Status poll failed")
-            time.sleep(max(50, status_poll_ms) / 1000.0)
 
-    threading.Thread(target=watchdog, daemon=True).start()
+            if time.monotonic_ns() - last_motion_ns <= status_idle_after_ns:
+                await asyncio.sleep(poll_ms / 1000.0)
+                continue
+
+            # Stationary: poll slowly, but wake up as soon as a command arrives
+            poll_wake.clear()
+            try:
+                await asyncio.wait_for(poll_wake.wait(), timeout=idle_poll_ms / 1000.0)
+            except asyncio.TimeoutError:
+                pass
 
-    subscriber = MqttSubscriber(mqtt_cfg, handle)
+    subscriber = MqttSubscriber(mqtt_cfg, handle, loop)
 
-    # Start status polling thread (after subscriber is created)
-    threading.Thread(target=status_poller, daemon=True).start()
+    # Start status polling task (after subscriber is created)
+    spawn(status_poller())
 
-    # Enter MQTT loop
-    subscriber.loop_forever()
+    # Start MQTT (paho I/O läuft im asyncio Loop, kein eigener Thread)
+    subscriber.start()
+    try:
+        await stop_event.wait()
+        log.info("Stop signal received, shutting down...")
+    finally:
+        disarm_stop()
+        for t in list(bg_tasks):
+            t.cancel()
+        subscriber.stop()
+        await hik.aclose()
+
+
+def main():
+    asyncio.run(amain())
 
 
 if __name__ == "__main__":
@@ -1,15 +1,47 @@
+from __future__ import annotations
+
+import re
 import json
-import time
+import socket
+import asyncio
 import logging
 import threading
 from dataclasses import dataclass
 
 import paho.mqtt.client as mqtt
 
+try:
+    from orjson import loads as json_loads
+except ImportError:  # stdlib fallback
+    # Häufigstes Payload (Joystick-MOVE mit Integer-Achsen) ohne JSON-Parser;
+    # lohnt nur gegenüber json.loads, orjson ist schneller als die Regex
+    _INT = rb"(-?(?:0|[1-9]\d*))"  # JSON-Integer, keine führenden Nullen
+    _MOVE_RE = re.compile(
+        rb'\{\s*"pan"\s*:\s*' + _INT + rb'\s*,\s*"tilt"\s*:\s*' + _INT + rb'\s*,\s*"zoom"\s*:\s*' + _INT
+        + rb'\s*(?:,\s*"speed"\s*:\s*' + _INT + rb'\s*)?\}\s*$'
+    )
+
+    def json_loads(raw: bytes):
+        m = _MOVE_RE.match(raw)
+        if m is None:
+            return json.loads(raw)
+        data = {"pan": int(m[1]), "tilt": int(m[2]), "zoom": int(m[3])}
+        if m[4] is not None:
+            data["speed"] = int(m[4])
+        return data
+
+__all__ = ("MqttConfig", "MqttSubscriber")
+
 log = logging.getLogger("hakvision_ptz.mqtt")
 
+PAYLOAD_ONLINE = b"online"
+PAYLOAD_OFFLINE = b"offline"
+
+# Max. MQTT-Pakete pro Socket-Wakeup (paho liest pro loop_read() nur eins)
+READ_BURST = 64
+
 
-@dataclass
+@dataclass(slots=True, frozen=True)
 class MqttConfig:
     host: str
     port: int
@@ -20,10 +52,21 @@ class MqttConfig:
 
 
 class MqttSubscriber:
-    def __init__(self, cfg: MqttConfig, on_message):
+    def __init__(self, cfg: MqttConfig, on_message, loop: asyncio.AbstractEventLoop):
         self.cfg = cfg
+        # async def on_message(topic, data) – läuft als Task im asyncio Loop
         self.on_message_cb = on_message
-        self.connected = threading.Event()
+        self.loop = loop
+        self.connected = asyncio.Event()
+        self._runner: asyncio.Task | None = None
+        self._tasks: set[asyncio.Task] = set()
+        # (topic, payload) aus dem aktuellen Lese-Burst, noch ungeparst
+        self._inbox: list[tuple[str, bytes]] = []
+        self._log_rx = log.isEnabledFor(logging.DEBUG)
+        # Reconnect-Backoff in Sekunden; zurückgesetzt nur durch erfolgreiches CONNACK
+        self._backoff = 1
+        # reconnect() läuft per to_thread → Socket-Callbacks können aus dem Worker kommen
+        self._loop_thread = threading.get_ident()
 
         # Paho v2 callback API (passt zu deiner _on_connect Signatur mit reason_code)
         self.client = mqtt.Client(mqtt.CallbackAPIVersion.VERSION2)
@@ -31,48 +74,153 @@ class MqttSubscriber:
         if cfg.username:
             self.client.username_pw_set(cfg.username, cfg.password)
 
+        # Topics einmal bauen statt bei jedem (Re-)Connect
+        self._cmd_topic = f"{cfg.topic_prefix}/{cfg.camera_id}/cmd/#"
+        self._connection_topic = f"{cfg.topic_prefix}/{cfg.camera_id}/status/connection"
+        self._move_topic = f"{cfg.topic_prefix}/{cfg.camera_id}/cmd/move"
+
         # Optional: Connection status (Last Will)
-        will_topic = f"{cfg.topic_prefix}/{cfg.camera_id}/status/connection"
-        self.client.will_set(will_topic, payload="offline", qos=0, retain=True)
+        self.client.will_set(self._connection_topic, payload=PAYLOAD_OFFLINE, qos=0, retain=True)
 
         self.client.on_connect = self._on_connect
         self.client.on_message = self._on_message
         self.client.on_disconnect = self._on_disconnect
 
+        # Kein paho-Thread: Socket-I/O läuft über add_reader/add_writer im asyncio Loop,
+        # alle Callbacks damit ebenfalls im Loop-Thread
+        self.client.on_socket_open = self._on_socket_open
+        self.client.on_socket_close = self._on_socket_close
+        self.client.on_socket_register_write = self._on_socket_register_write
+        self.client.on_socket_unregister_write = self._on_socket_unregister_write
+
+    def _in_loop(self, fn, *args):
+        # add_reader/add_writer sind nicht thread-safe
+        if threading.get_ident() == self._loop_thread:
+            fn(*args)
+        else:
+            self.loop.call_soon_threadsafe(fn, *args)
+
+    def _on_socket_open(self, client, userdata, sock):
+        self._in_loop(self.loop.add_reader, sock, self._on_readable, client, sock)
+
+    def _on_readable(self, client, sock):
+        # Alles lesen, was schon im Socket liegt, dann den Burst gesammelt verteilen
+        for _ in range(READ_BURST):
+            if client.loop_read() != mqtt.MQTT_ERR_SUCCESS:
+                break
+            try:
+                if not sock.recv(1, socket.MSG_PEEK):
+                    break
+            except (BlockingIOError, OSError):
+                break
+        self._dispatch_inbox()
+
+    def _on_socket_close(self, client, userdata, sock):
+        self._in_loop(self.loop.remove_reader, sock)
+        self._in_loop(self.loop.remove_writer, sock)
+
+    def _on_socket_register_write(self, client, userdata, sock):
+        self._in_loop(self.loop.add_writer, sock, client.loop_write)
+
+    def _on_socket_unregister_write(self, client, userdata, sock):
+        self._in_loop(self.loop.remove_writer, sock)
+
     def _on_connect(self, client, userdata, flags, reason_code, properties=None):
+        if reason_code.is_failure:
+            # Broker trennt danach; _run versucht es mit wachsendem Backoff erneut
+            log.warning("MQTT connect refused: %s", reason_code)
+            return
+        self._backoff = 1
         log.info("Connected to MQTT (%s:%s), subscribing...", self.cfg.host, self.cfg.port)
-        base = f"{self.cfg.topic_prefix}/{self.cfg.camera_id}/cmd/#"
-        client.subscribe(base, qos=0)
-        log.info("Subscribed to %s", base)
+        client.subscribe(self._cmd_topic, qos=0)
+        log.info("Subscribed to %s", self._cmd_topic)
 
         # Mark online
-        online_topic = f"{self.cfg.topic_prefix}/{self.cfg.camera_id}/status/connection"
-        client.publish(online_topic, payload="online", qos=0, retain=True)
+        client.publish(self._connection_topic, payload=PAYLOAD_ONLINE, qos=0, retain=True)
 
         self.connected.set()
 
-    def _on_disconnect(self, client, userdata, reason_code, properties=None):
+    def _on_disconnect(self, client, userdata, disconnect_flags=None, reason_code=None, properties=None):
         log.warning("Disconnected from MQTT (reason_code=%s)", reason_code)
         self.connected.clear()
 
     def _on_message(self, client, userdata, msg):
-        payload = msg.payload.decode("utf-8", errors="replace").strip()
-        log.info("MQTT RX topic=%s payload=%s", msg.topic, payload)
-
-        try:
-            data = json.loads(payload) if payload else {}
-        except Exception:
-            data = {"_raw": payload}
-
-        self.on_message_cb(msg.topic, data, time.time())
-
-    def publish(self, topic: str, payload: str, retain: bool = False, qos: int = 0):
+        topic, raw = msg.topic, msg.payload
+        if self._log_rx:
+            log.debug("MQTT RX topic=%s payload=%r", topic, raw)
+        self._inbox.append((topic, raw))
+
+    def _dispatch_inbox(self):
+        inbox, self._inbox = self._inbox, []
+        last = len(inbox) - 1
+        for i, (topic, raw) in enumerate(inbox):
+            # Direkt aufeinanderfolgende Joystick-MOVEs: nur der neueste wird geparst
+            # und ausgeführt. MOVEs mit duration_ms und alle anderen Topics
+            # (STOP, PRESET, ...) laufen einzeln durch.
+            if (
+                i < last
+                and topic == self._move_topic
+                and inbox[i + 1][0] == topic
+                and b"duration_ms" not in raw
+                and b"duration_ms" not in inbox[i + 1][1]
+            ):
+                continue
+
+            # Parser bekommt die Bytes direkt; dekodiert wird nur im Fehlerfall
+            try:
+                data = json_loads(raw) if raw and not raw.isspace() else {}
+            except ValueError:
+                data = {"_raw": raw.decode("utf-8", errors="replace").strip()}
+
+            task = self.loop.create_task(self.on_message_cb(topic, data))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+    def publish(self, topic: str, payload: str | bytes, retain: bool = False, qos: int = 0):
         """
         Publish helper for main.py (status, ack, etc.)
         """
         self.client.publish(topic, payload=payload, qos=qos, retain=retain)
 
-    def loop_forever(self):
+    def start(self):
         log.info("Connecting to MQTT broker %s:%s ...", self.cfg.host, self.cfg.port)
-        self.client.connect(self.cfg.host, self.cfg.port, keepalive=30)
-        self.client.loop_forever()
+        self.client.connect_async(self.cfg.host, self.cfg.port, keepalive=30)
+        self._runner = self.loop.create_task(self._run())
+
+    async def _run(self):
+        # Ersetzt loop_start(): Keepalive (loop_misc) und Reconnect mit Backoff.
+        # reconnect() blockiert (DNS, TCP-Connect) → im Worker-Thread, nicht im Loop
+        while True:
+            if self.client.loop_misc() == mqtt.MQTT_ERR_NO_CONN:
+                delay = self._backoff
+                self._backoff = min(delay * 2, 30)
+                try:
+                    await asyncio.to_thread(self.client.reconnect)
+                except OSError as e:
+                    log.warning("MQTT connect failed: %s (retry in %ss)", e, delay)
+                except Exception:
+                    # z.B. ValueError (Host/Port) oder SSL-Fehler: der Runner darf nicht sterben
+                    log.exception("MQTT connect failed (retry in %ss)", delay)
+                # Wartet bis CONNACK (dann sofort weiter) oder volle Backoff-Zeit
+                # (Connect fehlgeschlagen oder vom Broker abgelehnt)
+                try:
+                    await asyncio.wait_for(self.connected.wait(), delay)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+            await asyncio.sleep(1)
+
+    def stop(self):
+        if self._runner is not None:
+            self._runner.cancel()
+        try:
+            # Sauberes DISCONNECT verwirft das Last Will → offline selbst setzen
+            if self.connected.is_set():
+                self.client.publish(self._connection_topic, payload=PAYLOAD_OFFLINE, qos=0, retain=True)
+            self.client.disconnect()
+            # offline + DISCONNECT noch rausschreiben, der Loop läuft danach nicht mehr lange
+            self.client.loop_write()
+        except Exception:
+            pass
+        for t in list(self._tasks):
+            t.cancel()
@@ -1,64 +1,131 @@
 import asyncio
 import datetime
+import functools
 import json
 import logging
 import os
 import socket
 import sys
 import signal
-from pathlib import Path
-from typing import Any, Dict, Optional, Tuple
+from typing import Any, Dict, List, Optional, Tuple
 
 import paho.mqtt.client as mqtt
 from asyncua import Client, ua
 
 from .config import load_options
-from .topics import normalize_topic, topic_value, topic_status, topic_error
-from .payload import parse_payload
+from .topics import normalize_topic, topic_value, topic_set, topic_status, topic_error
+from .payload import payload_parser
 from .security import (
     map_security_policy,
     map_security_mode,
     cert_contains_uri,
     pki_paths,
 )
-from .tags import load_tags, tags_is_empty, write_yaml, merge_tags
-from .discovery import browse_export, export_to_tags
+from .tags import load_tags, tags_is_empty, write_tags, merge_tags
+from .discovery import discover_nodes, make_export, write_export
 from .mqtt_helpers import mqtt_connect_or_fail
 
-
-def _variant_for_type(value, t: str) -> ua.Variant:
+# MonitoredItems pro CreateMonitoredItems-Request (Server begrenzen MaxMonitoredItemsPerCall)
+SUBSCRIBE_CHUNK_SIZE = 1000
+# QoS>0-Nachrichten gleichzeitig unterwegs (paho Default 20 bremst den Initial-Burst nach dem Subscribe)
+MQTT_MAX_INFLIGHT = 1000
+# Max. wartende MQTT-Writes, darüber wird verworfen (mit Fehler-Topic)
+WRITE_QUEUE_SIZE = 10000
+# Max. Writes pro OPC-Write-Request (was beim Abholen schon in der Queue wartet).
+# Default 1: jeder Write einzeln in MQTT-Reihenfolge (PLC-Handshakes); Writes auf
+# verschiedene Nodes in einem Request haben auf dem Server keine garantierte Reihenfolge,
+# größere Batches daher nur per bridge.write_batch_size
+WRITE_BATCH_SIZE = 1
+# Set-Topics pro SUBSCRIBE/UNSUBSCRIBE-Paket
+MQTT_SUBSCRIBE_CHUNK_SIZE = 200
+
+# Hostname für die Default-ApplicationUri; ändert sich zur Laufzeit nicht
+HOST_ACTUAL = (socket.gethostname() or "ha-addon").strip()
+
+
+# NodeId-Strings aus tags.yaml nur einmal parsen, nicht bei jedem (Re-)Subscribe;
+# die NodeId-Objekte werden nur gelesen, daher teilbar
+@functools.lru_cache(maxsize=65536)
+def _parse_nodeid(nodeid: str) -> ua.NodeId:
+    return ua.NodeId.from_string(nodeid)
+
+
+def _bool_variant(value) -> ua.Variant:
+    # parse_payload liefert bei bool i.d.R. schon bool – wir bleiben defensiv
+    if isinstance(value, str):
+        v = value.strip().lower()
+        value = v in ("1", "true", "on", "yes")
+    return ua.Variant(bool(value), ua.VariantType.Boolean)
+
+
+def _numeric_variant(cast, vtype: ua.VariantType):
+    return lambda value: ua.Variant(cast(value), vtype)
+
+
+# Tag-Typ → Variant-Builder; nicht gelistete Typen: asyncua soll raten
+_VARIANT_BUILDERS: Dict[str, Any] = {}
+for _aliases, _builder in (
+    (("float", "real"), _numeric_variant(float, ua.VariantType.Float)),
+    (("double", "lreal"), _numeric_variant(float, ua.VariantType.Double)),
+    (("int", "int16"), _numeric_variant(int, ua.VariantType.Int16)),
+    (("dint", "int32"), _numeric_variant(int, ua.VariantType.Int32)),
+    (("uint", "uint16", "word"), _numeric_variant(int, ua.VariantType.UInt16)),
+    (("udint", "uint32", "dword"), _numeric_variant(int, ua.VariantType.UInt32)),
+    (("byte", "uint8"), _numeric_variant(int, ua.VariantType.Byte)),
+    (("bool", "boolean"), _bool_variant),
+):
+    for _a in _aliases:
+        _VARIANT_BUILDERS[_a] = _builder
+del _aliases, _builder, _a
+
+
+def _parse_datetime(value):
+    # DateTime: support ISO with Z
+    vv = str(value)
+    if vv.endswith("Z"):
+        vv = vv[:-1] + "+00:00"
+    try:
+        return datetime.datetime.fromisoformat(vv)
+    except Exception:
+        return value
+
+
+@functools.lru_cache(maxsize=256)
+def _write_converter(t: str):
+    # Einmal pro Typ-String: MQTT-Payload → ua.Variant, ohne Typ-String-Vergleiche pro Write;
+    # Converter sind zustandslos → alle rw-Tags gleichen Typs (und jeder Reconnect) teilen ihn
     tt = (t or "").lower().strip()
-
-    if tt in ("float", "real"):
-        return ua.Variant(float(value), ua.VariantType.Float)
-
-    if tt in ("double", "lreal"):
-        return ua.Variant(float(value), ua.VariantType.Double)
-
-    if tt in ("int", "int16"):
-        return ua.Variant(int(value), ua.VariantType.Int16)
-
-    if tt in ("dint", "int32"):
-        return ua.Variant(int(value), ua.VariantType.Int32)
-
-    if tt in ("uint", "uint16", "word"):
-        return ua.Variant(int(value), ua.VariantType.UInt16)
-
-    if tt in ("udint", "uint32", "dword"):
-        return ua.Variant(int(value), ua.VariantType.UInt32)
-
-    if tt in ("byte", "uint8"):
-        return ua.Variant(int(value), ua.VariantType.Byte)
-
-    if tt in ("bool", "boolean"):
-        # parse_payload liefert bei bool i.d.R. schon bool – wir bleiben defensiv
-        if isinstance(value, str):
-            v = value.strip().lower()
-            value = v in ("1", "true", "on", "yes")
-        return ua.Variant(bool(value), ua.VariantType.Boolean)
-
-    # fallback: asyncua soll raten
-    return ua.Variant(value)
+    parse = payload_parser(t)
+    build = _VARIANT_BUILDERS.get(tt, ua.Variant)
+    if tt in ("datetime", "date", "time"):
+        return lambda payload: build(_parse_datetime(parse(payload)))
+    return lambda payload: build(parse(payload))
+
+
+def _encode_payload(val) -> Optional[bytes]:
+    # Allgemeiner Fall; Ergebnis identisch zu dem, was paho selbst aus str/int/float macht
+    if isinstance(val, bool):
+        return b"true" if val else b"false"
+    if isinstance(val, (datetime.datetime, datetime.date, datetime.time)):
+        return val.isoformat().encode("utf-8")
+    if isinstance(val, (list, dict)):
+        return json.dumps(val, ensure_ascii=False, default=str).encode("utf-8")
+    if val is None:
+        return None
+    if isinstance(val, (bytes, bytearray)):
+        return val
+    return str(val).encode("utf-8")
+
+
+# Schnellpfad pro exaktem Python-Typ: Bytes werden einmal im Loop gebaut, nicht erst in paho
+_PAYLOAD_ENCODERS: Dict[type, Any] = {
+    bool: lambda v: b"true" if v else b"false",
+    int: lambda v: str(v).encode("ascii"),
+    float: lambda v: str(v).encode("ascii"),
+    str: lambda v: v.encode("utf-8"),
+    bytes: lambda v: v,
+    type(None): lambda v: None,
+}
 
 
 class SubHandler:
@@ -77,44 +144,61 @@ class SubHandler:
         self.retain = bool(retain_states)
         self.log = log
         self.on_status = on_status  # <-- hinzufügen
-        self.nodeid_to_path: Dict[str, str] = {}
+        # Key (NamespaceIndex, Identifier) statt nodeid.to_string(): hasht ohne Formatierung;
+        # Wert ist das fertige State-Topic, wird einmal beim Subscriben gebaut
+        self.nodeid_to_topic: Dict[Tuple[int, Any], str] = {}
+        self._meta_topic = normalize_topic(self.prefix, "meta/last_publish_ts")
         self._last_meta_ts = 0.0
+        # Notifications eines Publish-Zyklus sammeln, dann gesammelt an paho übergeben
+        self._pending: List[Tuple[str, Optional[bytes]]] = []
+
+    def add_node(self, node, path: str) -> None:
+        if not path:
+            return
+        nid = node.nodeid
+        self.nodeid_to_topic[(nid.NamespaceIndex, nid.Identifier)] = topic_value(self.prefix, path)
 
     def datachange_notification(self, node, val, data):
         try:
-            nodeid_str = node.nodeid.to_string()
-            path = self.nodeid_to_path.get(nodeid_str)
-            if not path:
+            nid = node.nodeid
+            topic = self.nodeid_to_topic.get((nid.NamespaceIndex, nid.Identifier))
+            if not topic:
                 return
 
-            topic = topic_value(self.prefix, path)
-            payload = val
-
-            if isinstance(val, bool):
-                payload = "true" if val else "false"
-            elif isinstance(val, (datetime.datetime, datetime.date, datetime.time)):
-                payload = val.isoformat()
-            elif isinstance(val, (list, dict)):
-                payload = json.dumps(val, ensure_ascii=False, default=str)
-            elif val is None:
-                payload = None
-            elif not isinstance(val, (str, bytes, bytearray, int, float)):
-                payload = str(val)
-
-            self.mqtt.publish(topic, payload, qos=self.qos, retain=self.retain)
-            # --- rate limited meta publish ---
-            now = asyncio.get_running_loop().time()
-            if now - self._last_meta_ts >= 5.0:  # maximal alle 5 Sekunden
-                self._last_meta_ts = now
+            enc = _PAYLOAD_ENCODERS.get(type(val), _encode_payload)
+            payload = enc(val)
+
+            # asyncua liefert alle Notifications einer PublishResponse direkt hintereinander
+            # (sync bzw. als bereits eingeplante Tasks) → call_soon läuft erst danach
+            if not self._pending:
+                asyncio.get_running_loop().call_soon(self._flush)
+            self._pending.append((topic, payload))
+
+        except Exception as e:
+            self.log.warning("DataChange publish failed: %s", e)
+
+    def _flush(self):
+        batch, self._pending = self._pending, []
+        publish, qos, retain = self.mqtt.publish, self.qos, self.retain
+        for topic, payload in batch:
+            try:
+                publish(topic, payload, qos=qos, retain=retain)
+            except Exception as e:
+                self.log.warning("DataChange publish failed: %s", e)
+
+        # --- rate limited meta publish, einmal pro Batch geprüft ---
+        now = asyncio.get_running_loop().time()
+        if now - self._last_meta_ts >= 5.0:  # maximal alle 5 Sekunden
+            self._last_meta_ts = now
+            try:
                 self.mqtt.publish(
-                    normalize_topic(self.prefix, "meta/last_publish_ts"),
+                    self._meta_topic,
                     datetime.datetime.utcnow().isoformat() + "Z",
                     qos=1,
                     retain=True,
                 )
-
-        except Exception as e:
-            self.log.warning("DataChange publish failed: %s", e)
+            except Exception as e:
+                self.log.warning("DataChange publish failed: %s", e)
 
     # ✅ neu: asyncua ruft das bei Subscription/Session Problemen auf
     def status_change_notification(self, status):
@@ -131,8 +215,13 @@ async def run_bridge_forever():
     stop_event = asyncio.Event()
     opc_online = asyncio.Event()
     reconnect_event = asyncio.Event()
-    pending_write_tasks: set[asyncio.Task] = set()
-    write_lock = asyncio.Lock()  # optional, aber sehr hilfreich
+    # MQTT-Writes: paho-thread füllt die Queue, ein Writer-Task pro OPC-Session arbeitet sie
+    # in Eingangsreihenfolge ab (ersetzt Task pro Nachricht + write_lock)
+    write_queue: asyncio.Queue = asyncio.Queue(maxsize=WRITE_QUEUE_SIZE)
+    writer_task: Optional[asyncio.Task] = None
+    # Writes pro Request, die der Server annimmt; halbiert bei BadTooManyOperations
+    # (MaxNodesPerWrite), gilt bis zum nächsten OPC-Connect
+    write_limit = WRITE_BATCH_SIZE
 
     loop = asyncio.get_running_loop()
     for sig in ("SIGTERM", "SIGINT"):
@@ -171,6 +260,7 @@ async def run_bridge_forever():
     generated_tags_file = bridge_cfg.get("generated_tags_file", "/config/opcua_mqtt_bridge/tags.generated.yaml")
     merge_into = bool(bridge_cfg.get("merge_into_tags_file", True))
     browse_cfg = bridge_cfg.get("browse", {}) or {}
+    write_batch_size = max(1, int(bridge_cfg.get("write_batch_size", WRITE_BATCH_SIZE)))
 
     existing_tags = load_tags(tags_file) if os.path.exists(tags_file) else {"read": [], "rw": []}
     need_export = auto_export and (not os.path.exists(export_file) or tags_is_empty(existing_tags))
@@ -190,9 +280,12 @@ async def run_bridge_forever():
     if mqtt_cfg.get("username"):
         mqtt_client.username_pw_set(mqtt_cfg["username"], mqtt_cfg.get("password") or "")
 
+    # prefix ist schon ohne "/" am Ende → Meta-Topics per Konkatenation, ohne strip pro Aufruf
+    meta_prefix = normalize_topic(prefix, "meta/")
+
     def pub_meta(name: str, payload: str, retain: bool = True, qos: int = 1):
         try:
-            mqtt_client.publish(normalize_topic(prefix, f"meta/{name}"), payload, qos=qos, retain=retain)
+            mqtt_client.publish(meta_prefix + name, payload, qos=qos, retain=retain)
         except Exception:
             pass
     
@@ -200,67 +293,148 @@ async def run_bridge_forever():
         return int(getattr(rc, "value", rc if rc is not None else -1))
 
     # Write map (wird bei OPCUA-Connect gefüllt; on_message greift darauf zu)
-    write_nodes: Dict[str, Tuple[Any, str]] = {}
+    # Key ist das komplette Set-Topic "<prefix>/<path>/set" → ein Dict-Lookup pro Nachricht
+    # set-Topic -> (path, node, convert, status-Topic, error-Topic); Topics einmal pro Tag gebaut
+    write_nodes: Dict[str, Tuple[str, Any, Any, str, str]] = {}
+    # Beim Broker abonnierte Set-Topics; wird nur ersetzt, nie verändert (paho-Thread liest mit)
+    cmd_topics: frozenset = frozenset()
+
+    def _mqtt_subscribe_topics(client, topics):
+        topics = list(topics)
+        for i in range(0, len(topics), MQTT_SUBSCRIBE_CHUNK_SIZE):
+            client.subscribe([(t, qos_cmd) for t in topics[i:i + MQTT_SUBSCRIBE_CHUNK_SIZE]])
+
+    def sync_cmd_topics():
+        # Genau die Set-Topics abonnieren statt <prefix>/#: sonst kommt jedes eigene
+        # State-Publish vom Broker zurück und muss in on_message verworfen werden
+        nonlocal cmd_topics
+        new = frozenset(write_nodes)
+        _mqtt_subscribe_topics(mqtt_client, new - cmd_topics)
+        gone = list(cmd_topics - new)
+        for i in range(0, len(gone), MQTT_SUBSCRIBE_CHUNK_SIZE):
+            mqtt_client.unsubscribe(gone[i:i + MQTT_SUBSCRIBE_CHUNK_SIZE])
+        cmd_topics = new
+
+    def write_failed(path: str, error_t: str, e: Exception):
+        log.error("Write error %s: %s", path, e)
+        mqtt_client.publish(error_t, str(e), qos=1, retain=False)
+
+    async def do_writes(opc: Client, batch: List[Tuple[str, Any, Any, str, str, bytes]]):
+        # Payloads konvertieren, dann alle Werte in so wenig Write-Requests wie der Server
+        # annimmt (bei BadTooManyOperations halbieren, wie _read_attributes); Ergebnis je Item
+        nonlocal write_limit
+        nodes, values, targets = [], [], []
+        for path, node, convert, status_t, error_t, payload in batch:
+            try:
+                values.append(ua.DataValue(convert(payload)))
+            except Exception as e:
+                write_failed(path, error_t, e)
+                continue
+            nodes.append(node)
+            targets.append((path, status_t, error_t))
+
+        i = 0
+        while i < len(nodes):
+            n = min(write_limit, len(nodes) - i)
+            try:
+                results = await opc.write_values(nodes[i:i + n], values[i:i + n], raise_on_partial_error=False)
+            except ua.uaerrors.BadTooManyOperations as e:
+                if n > 1:
+                    write_limit = max(1, n // 2)
+                    continue
+                results = [e]
+            except Exception as e:
+                results = [e] * n
+
+            for (path, status_t, error_t), sc in zip(targets[i:i + n], results):
+                try:
+                    if isinstance(sc, Exception):
+                        raise sc
+                    sc.check()
+                except Exception as e:
+                    write_failed(path, error_t, e)
+                else:
+                    mqtt_client.publish(status_t, "ok", qos=1, retain=False)
+            i += n
+
+    async def write_worker(opc: Client):
+        carry = None
+        while True:
+            item = carry if carry is not None else await write_queue.get()
+            carry = None
+            batch, nodes = [item], {item[1]}
+            # Was schon wartet, mitnehmen; derselbe Node zweimal → nächster Request,
+            # damit Writes auf einen Node in MQTT-Reihenfolge ankommen
+            while len(batch) < write_batch_size and not write_queue.empty():
+                item = write_queue.get_nowait()
+                if item[1] in nodes:
+                    carry = item
+                    break
+                nodes.add(item[1])
+                batch.append(item)
+            await do_writes(opc, batch)
+
+    def _writer_done(task: asyncio.Task):
+        # Der Writer darf nicht still sterben, sonst läuft die Queue voll und niemand merkt es
+        nonlocal writer_task
+        if task.cancelled() or task.exception() is None:
+            return
+        log.error("Write worker crashed, reconnecting", exc_info=task.exception())
+        if writer_task is task:
+            writer_task = None
+        reconnect_event.set()
+
+    def start_writer(opc: Client):
+        nonlocal writer_task, write_limit
+        write_limit = write_batch_size
+        writer_task = asyncio.create_task(write_worker(opc))
+        writer_task.add_done_callback(_writer_done)
+
+    def stop_writes():
+        # Laufenden Write abbrechen und wartende verwerfen (OPC offline / Reconnect / Stop)
+        nonlocal writer_task
+        if writer_task is not None:
+            writer_task.cancel()
+            writer_task = None
+        while not write_queue.empty():
+            write_queue.get_nowait()
+
+    def enqueue_write(item: Tuple[str, Any, Any, str, str, bytes]):
+        path, error_t = item[0], item[4]
+        # Zwischen on_message und hier kann die Session weggebrochen sein
+        if writer_task is None or not opc_online.is_set():
+            mqtt_client.publish(error_t, "opc_offline", qos=1, retain=False)
+            return
+        try:
+            write_queue.put_nowait(item)
+        except asyncio.QueueFull:
+            log.warning("Write queue full, dropping write on %s", path)
+            mqtt_client.publish(error_t, "queue_full", qos=1, retain=False)
 
     # MQTT on_message: <prefix>/<path>/set
     def on_message(_client_m, _userdata, msg):
         try:
-            base = prefix.rstrip("/") + "/"
-            if not msg.topic.startswith(base):
-                return
-
-            rel = msg.topic[len(base):]
-            if not rel.endswith("/set"):
-                return
-
-            path = rel[:-4]
-            if path not in write_nodes:
+            # msg.topic dekodiert bei jedem Zugriff neu → einmal holen
+            topic = msg.topic
+            entry = write_nodes.get(topic)
+            if entry is None:
                 return
 
             # never accept retained writes
-            if getattr(msg, "retain", False):
-                log.info("Ignoring retained write on %s", msg.topic)
+            if msg.retain:
+                log.info("Ignoring retained write on %s", topic)
                 return
 
-            payload = msg.payload.decode("utf-8", errors="replace")
-            node, t = write_nodes[path]
             # Wenn OPC offline ist, keine Writes anstoßen (verhindert "Future already done")
             if not opc_online.is_set():
-                log.info("Ignoring write (OPC offline) on %s", msg.topic)
-                mqtt_client.publish(topic_error(prefix, path), "opc_offline", qos=1, retain=False)
+                log.info("Ignoring write (OPC offline) on %s", topic)
+                mqtt_client.publish(entry[4], "opc_offline", qos=1, retain=False)
                 return
 
-            async def do_write():
-                try:
-                    async with write_lock:
-                        value = parse_payload(payload, t)
-
-                        # DateTime: support ISO with Z
-                        if (t or "").strip().lower() in ("datetime", "date", "time"):
-                            vv = str(value)
-                            if vv.endswith("Z"):
-                                vv = vv[:-1] + "+00:00"
-                            try:
-                                value = datetime.datetime.fromisoformat(vv)
-                            except Exception:
-                                pass
-
-                        variant = _variant_for_type(value, t)
-                        dv = ua.DataValue(variant)
-                        await node.write_value(dv)
-
-                    mqtt_client.publish(topic_status(prefix, path), "ok", qos=1, retain=False)
-                except Exception as e:
-                    log.error("Write error %s: %s", path, e)
-                    mqtt_client.publish(topic_error(prefix, path), str(e), qos=1, retain=False)
-
-            def _schedule_write():
-                task = asyncio.create_task(do_write())
-                pending_write_tasks.add(task)
-                task.add_done_callback(lambda t: pending_write_tasks.discard(t))
-
-            # paho callbacks laufen im paho-thread -> ins asyncio loop schieben
-            loop.call_soon_threadsafe(_schedule_write)
+            # paho callbacks laufen im paho-thread -> nur das Einreihen in den asyncio loop schieben.
+            # Ein Hop, kein Task/Future pro Nachricht (run_coroutine_threadsafe bräuchte beides);
+            # Payload bleibt bytes, geparst wird erst im Writer
+            loop.call_soon_threadsafe(enqueue_write, (*entry, msg.payload))
 
         except Exception as e:
             log.error("MQTT on_message error: %s", e)
@@ -277,24 +451,30 @@ async def run_bridge_forever():
             retain=True,
         )
 
-        client.subscribe(normalize_topic(prefix, "#"), qos=qos_cmd)
+        _mqtt_subscribe_topics(client, cmd_topics)
 
     def on_disconnect_runtime(client, userdata, disconnect_flags=None, reason_code=None, properties=None):
         log.warning("MQTT disconnected flags=%s rc=%s", disconnect_flags, _rc_to_int(reason_code))
         # Optional: availability auf offline setzen (aber Vorsicht: bei kurzen Glitches flackert HA)
         # client.publish(availability_topic, "offline", qos=1, retain=True)
 
-    mqtt_client.on_connect = on_connect_runtime
-    mqtt_client.on_disconnect = on_disconnect_runtime
+    # on_connect/on_disconnect erst nach dem ersten CONNACK setzen (mqtt_connect_or_fail
+    # setzt eigene); on_message und die Set-Abos bleiben über OPC-Reconnects bestehen
     mqtt_client.on_message = on_message
 
     mqtt_client.reconnect_delay_set(min_delay=1, max_delay=10)
+    mqtt_client.max_inflight_messages_set(MQTT_MAX_INFLIGHT)
+    mqtt_client.max_queued_messages_set(0)  # 0 = unbegrenzt, nichts wird verworfen
     mqtt_client.enable_logger(logging.getLogger("paho.mqtt.client"))
 
     mqtt_client.will_set(availability_topic, "offline", qos=1, retain=True)
 
     # Connect + wait for first CONNACK
     await mqtt_connect_or_fail(mqtt_client, mqtt_cfg, log)
+    # Ab jetzt reconnectet der paho-Thread (loop_start) selbst; on_connect_runtime
+    # abonniert danach die Set-Topics neu, die Session ist clean
+    mqtt_client.on_connect = on_connect_runtime
+    mqtt_client.on_disconnect = on_disconnect_runtime
     async def heartbeat_loop():
         while not stop_event.is_set():
             pub_meta("heartbeat_ts", datetime.datetime.utcnow().isoformat() + "Z", retain=True)
@@ -302,9 +482,7 @@ async def run_bridge_forever():
             await asyncio.sleep(10)
 
     hb_task = asyncio.create_task(heartbeat_loop())
-    
-    # weil wir bereits verbunden sind (on_connect war schon), einmal sicherheitshalber:
-    mqtt_client.subscribe(normalize_topic(prefix, "#"), qos=qos_cmd)
+    # Set-Topics werden nach dem Aufbau der Write-Map abonniert (sync_cmd_topics)
 
     backoff = 1
     backoff_max = 30
@@ -330,9 +508,8 @@ async def run_bridge_forever():
 
             client = Client(url)
 
-            host_actual = (socket.gethostname() or "ha-addon").strip()
             uri_suffix = (opc_cfg.get("application_uri_suffix") or "OPCUA2MQTT").strip()
-            default_app_uri = f"urn:{host_actual}:HA:{uri_suffix}"
+            default_app_uri = f"urn:{HOST_ACTUAL}:HA:{uri_suffix}"
 
             raw_app_uri = (opc_cfg.get("application_uri") or "").strip()
             app_uri = raw_app_uri if raw_app_uri.lower().startswith("urn:") else default_app_uri
@@ -412,6 +589,7 @@ async def run_bridge_forever():
             pub_meta("opc_state", "online", retain=True)
             pub_meta("opc_last_ok_ts", datetime.datetime.utcnow().isoformat() + "Z", retain=True)
             write_nodes.clear()
+            start_writer(client)
             opc_online.set()
             reconnect_event.clear()
             mqtt_client.publish(availability_topic, "online", qos=1, retain=True)
@@ -423,25 +601,25 @@ async def run_bridge_forever():
                 exclude_prefixes = browse_cfg.get("exclude_path_prefixes", ["Server/", "ServerStatus/"])
                 include_only_prefixes = browse_cfg.get("include_only_prefixes", ["DB", "DataBlocksGlobal"])
 
-                export = await browse_export(
+                discovered = await discover_nodes(
                     client=client,
                     max_depth=max_depth,
                     namespace_filter=namespace_filter,
                     exclude_prefixes=exclude_prefixes,
                     include_only_prefixes=include_only_prefixes,
-                    log=log,
+                    concurrency=int(browse_cfg.get("concurrency", 32)),
                 )
+                log.info("Discovery export collected %d variables.", len(discovered))
 
-                Path(os.path.dirname(export_file)).mkdir(parents=True, exist_ok=True)
-                with open(export_file, "w", encoding="utf-8") as f:
-                    json.dump(export, f, ensure_ascii=False, indent=2)
+                write_export(export_file, make_export(client, discovered))
 
-                generated = export_to_tags(export)
-                write_yaml(generated_tags_file, generated)
+                # Tags direkt aus den Spalten, ohne Umweg über die Export-Dicts
+                generated = discovered.to_tags()
+                write_tags(generated_tags_file, generated)
 
                 if merge_into:
                     merged = merge_tags(existing_tags, generated)
-                    write_yaml(tags_file, merged)
+                    write_tags(tags_file, merged)
                     existing_tags = merged
 
                 log.info(
@@ -453,6 +631,9 @@ async def run_bridge_forever():
                 need_export = False
 
             tags = load_tags(tags_file)
+            # load_tags legt read/rw immer an; "read:" ohne Einträge ist in YAML aber None
+            read_tags = tags["read"] or []
+            rw_tags = tags["rw"] or []
 
             def _on_sub_status(_status):
                 nonlocal reconnect_count
@@ -461,9 +642,7 @@ async def run_bridge_forever():
                 opc_online.clear()
                 write_nodes.clear()  # <- neu
 
-                for t in list(pending_write_tasks):
-                    t.cancel()
-                pending_write_tasks.clear()
+                stop_writes()
 
                 mqtt_client.publish(availability_topic, "offline", qos=1, retain=True)
                 pub_meta("opc_state", "offline", retain=True)
@@ -474,29 +653,55 @@ async def run_bridge_forever():
 
             subscription = await client.create_subscription(publishing_interval_ms, handler)
 
-            # Subscribe read
-            for tag in tags.get("read", []):
-                path = tag["path"]
+            # Nodes + Pfade sammeln, dann gebündelt subscriben (ein Request statt einer pro Tag).
+            # Key ist der NodeId-String aus tags.yaml: steht ein Node mehrfach drin (read + rw),
+            # gibt es nur ein Node-Objekt und ein MonitoredItem, der letzte Pfad gewinnt
+            subscribed: Dict[str, Tuple[Any, str]] = {}
+            for tag in read_tags:
                 nodeid = tag["node"]
-                node = client.get_node(ua.NodeId.from_string(nodeid))
-                handler.nodeid_to_path[node.nodeid.to_string()] = path
-                await subscription.subscribe_data_change(node)
+                entry = subscribed.get(nodeid)
+                node = entry[0] if entry else client.get_node(_parse_nodeid(nodeid))
+                subscribed[nodeid] = (node, tag["path"])
 
-            # Subscribe rw + prepare write map
-            for tag in tags.get("rw", []):
+            # rw + prepare write map
+            for tag in rw_tags:
                 path = tag["path"]
                 nodeid = tag["node"]
                 t = tag.get("type", "float")
-                node = client.get_node(ua.NodeId.from_string(nodeid))
-                handler.nodeid_to_path[node.nodeid.to_string()] = path
-                write_nodes[path] = (node, t)
-                await subscription.subscribe_data_change(node)
+                entry = subscribed.get(nodeid)
+                node = entry[0] if entry else client.get_node(_parse_nodeid(nodeid))
+                write_nodes[topic_set(prefix, path)] = (
+                    path, node, _write_converter(t), topic_status(prefix, path), topic_error(prefix, path)
+                )
+                subscribed[nodeid] = (node, path)
+
+            sync_cmd_topics()
 
-            log.info("Subscribed read=%d, rw=%d", len(tags.get("read", [])), len(tags.get("rw", [])))
+            sub_items = list(subscribed.values())
+            for node, path in sub_items:
+                handler.add_node(node, path)
+
+            # Chunks gleichzeitig senden: ein Round-Trip statt einem pro Chunk
+            chunks = [sub_items[i:i + SUBSCRIBE_CHUNK_SIZE] for i in range(0, len(sub_items), SUBSCRIBE_CHUNK_SIZE)]
+            results = await asyncio.gather(
+                *(subscription.subscribe_data_change([node for node, _ in chunk]) for chunk in chunks)
+            )
+            for chunk, handles in zip(chunks, results):
+                # Bei Listen wirft asyncua nicht, sondern liefert StatusCode je fehlgeschlagenem Item
+                for (_, path), h in zip(chunk, handles):
+                    if isinstance(h, ua.StatusCode):
+                        log.warning("Subscribe failed for %s: %s", path, h.name)
+
+            log.info("Subscribed read=%d, rw=%d", len(read_tags), len(rw_tags))
 
             backoff = 1
-            while not stop_event.is_set() and not reconnect_event.is_set():
-                await asyncio.sleep(1)
+            # Schlafen bis Stop-Signal oder Reconnect-Anforderung, kein sekündliches Polling
+            waiters = [asyncio.ensure_future(stop_event.wait()), asyncio.ensure_future(reconnect_event.wait())]
+            try:
+                await asyncio.wait(waiters, return_when=asyncio.FIRST_COMPLETED)
+            finally:
+                for w in waiters:
+                    w.cancel()
 
             if reconnect_event.is_set():
                 log.warning("Reconnect requested (subscription status change).")
@@ -506,9 +711,7 @@ async def run_bridge_forever():
             log.info("Stop signal received, shutting down...")
             opc_online.clear()
             write_nodes.clear()
-            for t in list(pending_write_tasks):
-                t.cancel()
-            pending_write_tasks.clear()
+            stop_writes()
 
             try:
                 if subscription is not None:
@@ -522,9 +725,12 @@ async def run_bridge_forever():
             except Exception:
                 pass
 
-            mqtt_client.publish(availability_topic, "offline", qos=1, retain=True)
-            # 2️⃣ Kurz warten damit Publish rausgeht
-            await asyncio.sleep(0.2)
+            info = mqtt_client.publish(availability_topic, "offline", qos=1, retain=True)
+            # 2️⃣ Warten bis der Publish raus ist (PUBACK), statt fix zu schlafen; max. 1s
+            try:
+                await asyncio.to_thread(info.wait_for_publish, 1.0)
+            except (ValueError, RuntimeError):
+                pass
 
             # 3️⃣ Disconnect sauber anstoßen
             try:
@@ -557,9 +763,7 @@ async def run_bridge_forever():
                 
             opc_online.clear()
             write_nodes.clear()
-            for t in list(pending_write_tasks):
-                t.cancel()
-            pending_write_tasks.clear()
+            stop_writes()
 
             try:
                 if subscription is not None:
@@ -577,5 +781,10 @@ async def run_bridge_forever():
             if stop_event.is_set():
                 break
 
-            await asyncio.sleep(backoff)
+            # Backoff, aber bei Stop-Signal sofort raus
+            try:
+                await asyncio.wait_for(stop_event.wait(), timeout=backoff)
+                break
+            except asyncio.TimeoutError:
+                pass
             backoff = min(backoff * 2, backoff_max)
@@ -1,9 +1,16 @@
 import json
 from typing import Any, Dict
 
+try:
+    import orjson
+except ImportError:  # stdlib fallback
+    orjson = None
+
 OPTIONS_FILE = "/data/options.json"
 
 
 def load_options() -> Dict[str, Any]:
-    with open(OPTIONS_FILE, "r", encoding="utf-8") as f:
-        return json.load(f)
+    # Bytes lesen: orjson parst direkt ohne vorheriges UTF-8-Decode
+    with open(OPTIONS_FILE, "rb") as f:
+        raw = f.read()
+    return orjson.loads(raw) if orjson is not None else json.loads(raw)
@@ -1,131 +1,288 @@
+import re
+import os
+import sys
+import json
 import asyncio
-from typing import Any, Dict, List, Optional
+import functools
+from itertools import compress
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
 from asyncua import Client, ua, Node
+from asyncua.common.ua_utils import data_type_to_variant_type
 
+try:
+    import orjson
+except ImportError:  # stdlib fallback
+    orjson = None
+
+
+# Max. gleichzeitige OPC UA Requests beim Browsen (Default, per Option überschreibbar)
+BROWSE_CONCURRENCY = 32
+# ReadValueIds pro Read-Request (wird bei BadTooManyOperations halbiert)
+READ_CHUNK_SIZE = 500
 
-def _sanitize_path_part(s: str) -> str:
-    s = (s or "").strip()
-    repl = {"ä": "ae", "ö": "oe", "ü": "ue", "Ä": "Ae", "Ö": "Oe", "Ü": "Ue", "ß": "ss"}
-    for a, b in repl.items():
-        s = s.replace(a, b)
-    s = s.replace(" ", "_")
 
-    out = []
-    for ch in s:
-        if ch.isalnum() or ch in ("_", "-", "."):
-            out.append(ch.lower())
-        else:
-            out.append("_")
+_UMLAUTS = str.maketrans({
+    "ä": "ae", "ö": "oe", "ü": "ue", "Ä": "Ae", "Ö": "Oe", "Ü": "Ue", "ß": "ss",
+    # str.lower() würde am Wortende "ς" liefern, zeichenweise war es immer "σ"
+    "Σ": "σ",
+})
+# \w == isalnum() oder "_" → jede Folge aus "_" und ungültigen Zeichen (alles außer
+# "-" und ".") wird in einem Durchlauf zu genau einem "_"
+_RE_UNDERSCORE_RUN = re.compile(r"(?:_|[^\w.\-])+")
 
-    p = "".join(out)
-    while "__" in p:
-        p = p.replace("__", "_")
-    return p.strip("_")
+
+@functools.lru_cache(maxsize=8192)
+def _sanitize_path_part(s: str) -> str:
+    # Browse-Namen wiederholen sich stark (Geschwister, gleiche UDTs) → Cache
+    s = (s or "").strip().translate(_UMLAUTS)
+    return _RE_UNDERSCORE_RUN.sub("_", s).lower().strip("_")
 
 
 def _join_path(parts: List[str]) -> str:
-    return "/".join([_sanitize_path_part(p) for p in parts if p and str(p).strip()])
+    # Leere/Whitespace-Teile raus; isspace() statt strip() spart die Kopie pro Teil
+    return "/".join([_sanitize_path_part(p) for p in parts if p and not p.isspace()])
 
 
 def _access_can_write(access_level: int) -> bool:
     return bool(access_level & 0x02)
 
 
-async def browse_export(
+@dataclass
+class DiscoveredNodes:
+    # Spaltenweise statt ein Dict pro Variable; nodePath/Tag-Pfade werden erst beim Export gebaut
+    node_ids: List[str] = field(default_factory=list)
+    browse_paths: List[Tuple[str, ...]] = field(default_factory=list)
+    display_names: List[str] = field(default_factory=list)
+    data_types: List[str] = field(default_factory=list)
+    access_levels: List[int] = field(default_factory=list)
+
+    def __len__(self) -> int:
+        return len(self.node_ids)
+
+    def append(self, node_id: str, browse_path: Tuple[str, ...], display_name: str, data_type: str, access_level: int):
+        self.node_ids.append(node_id)
+        self.browse_paths.append(browse_path)
+        self.display_names.append(display_name)
+        self.data_types.append(sys.intern(data_type))
+        self.access_levels.append(access_level)
+
+    def to_export_nodes(self) -> List[Dict[str, Any]]:
+        return [
+            {
+                "nodeId": nid,
+                "browsePath": list(bp),
+                "nodePath": "/".join(bp),
+                "displayName": disp,
+                "dataType": dtype,
+                "accessLevel": al,
+            }
+            for nid, bp, disp, dtype, al in zip(
+                self.node_ids, self.browse_paths, self.display_names, self.data_types, self.access_levels
+            )
+        ]
+
+    def to_tags(self) -> Dict[str, Any]:
+        # Pfade einmal bauen, dann per Maske (itertools.compress) auf read/rw aufteilen
+        paths = [_join_path(bp) for bp in self.browse_paths]
+        rw_mask = [_access_can_write(al) for al in self.access_levels]
+        read_mask = [not w for w in rw_mask]
+
+        def bucket(mask: List[bool]) -> List[Dict[str, str]]:
+            return [
+                {"path": path, "node": nid, "type": dtype}
+                for path, nid, dtype in compress(zip(paths, self.node_ids, self.data_types), mask)
+            ]
+
+        return {"read": bucket(read_mask), "rw": bucket(rw_mask)}
+
+
+def _good(dv: Optional[ua.DataValue]) -> bool:
+    return dv is not None and dv.StatusCode.is_good() and dv.Value is not None
+
+
+async def _read_attributes(client: Client, nodeids: List[ua.NodeId], attrs: Tuple[ua.AttributeIds, ...]) -> List[ua.DataValue]:
+    # Ein Read-Request für alle (Node, Attribut)-Paare, Ergebnis node-major;
+    # lehnt der Server die Menge ab (BadTooManyOperations), wird halbiert
+    rvids = []
+    for nid in nodeids:
+        for attr in attrs:
+            rv = ua.ReadValueId()
+            rv.NodeId = nid
+            rv.AttributeId = attr
+            rvids.append(rv)
+
+    out: List[ua.DataValue] = []
+    chunk = READ_CHUNK_SIZE
+    i = 0
+    while i < len(rvids):
+        params = ua.ReadParameters()
+        params.NodesToRead = rvids[i:i + chunk]
+        try:
+            out.extend(await client.uaclient.read(params))
+        except ua.uaerrors.BadTooManyOperations:
+            if chunk == 1:
+                raise
+            chunk = max(1, chunk // 2)
+            continue
+        i += chunk
+    return out
+
+
+async def _variant_type_name(client: Client, dtype: ua.NodeId, cache: Dict[ua.NodeId, str]) -> str:
+    # Wie Node.read_data_type_as_variant_type, aber Builtin-Typen ohne Request
+    # und abgeleitete Typen nur einmal pro DataType-Node auflösen
+    name = cache.get(dtype)
+    if name is None:
+        try:
+            ident = dtype.Identifier
+            if dtype.NamespaceIndex == 0 and isinstance(ident, int) and ident < 30:
+                if ident == 29:
+                    vtype = ua.VariantType.Int32
+                elif ident in (24, 26, 27, 28):
+                    vtype = ua.VariantType.Variant
+                else:
+                    vtype = ua.VariantType(ident)
+            else:
+                vtype = await data_type_to_variant_type(client.get_node(dtype))
+            name = str(vtype)
+        except Exception:
+            name = "Unknown"
+        cache[dtype] = name
+    return name
+
+
+# BrowseName, DisplayName und NodeClass kommen schon mit der Browse-Antwort
+# (ReferenceDescription); gelesen werden nur noch DataType + AccessLevel der Variablen
+_VAR_ATTRS = (ua.AttributeIds.DataType, ua.AttributeIds.AccessLevel)
+# Server filtert schon beim Browse auf Objects + Variables
+_BROWSE_CLASS_MASK = ua.NodeClass.Object | ua.NodeClass.Variable
+
+
+async def discover_nodes(
     client: Client,
     max_depth: int,
     namespace_filter: Optional[List[int]],
     exclude_prefixes: List[str],
     include_only_prefixes: Optional[List[str]],
-    log,
-) -> Dict[str, Any]:
+    concurrency: int = BROWSE_CONCURRENCY,
+) -> DiscoveredNodes:
     root = client.nodes.objects
-    results: List[Dict[str, Any]] = []
+    results = DiscoveredNodes()
+    dtype_cache: Dict[ua.NodeId, str] = {}
+    # str.startswith mit Tupel prüft alle Präfixe in einem C-Aufruf
+    excl = tuple(exclude_prefixes or ())
+    incl = tuple(include_only_prefixes or ())
 
-    async def walk(node: Node, path_parts: List[str], depth: int):
-        if depth > max_depth:
-            return
-        try:
-            children = await node.get_children()
-        except Exception:
+    # Iterativ statt rekursiv: Queue mit (node, path_parts, order, depth), abgearbeitet von
+    # `concurrency` Workern (= max. gleichzeitige OPC UA Requests). order ist das Tupel der
+    # Kind-Indizes ab Root; danach sortiert ergibt sich wieder die Browse-Reihenfolge (DFS)
+    queue: asyncio.Queue = asyncio.Queue()
+    rows: List[tuple] = []  # (order, row)
+
+    async def visit(node: Node, path_parts: Tuple[str, ...], order: Tuple[int, ...], depth: int) -> None:
+        refs = await node.get_references(
+            refs=ua.ObjectIds.HierarchicalReferences,
+            direction=ua.BrowseDirection.Forward,
+            nodeclassmask=_BROWSE_CLASS_MASK,
+        )
+        if not refs:
             return
 
-        for ch in children:
+        kept = []  # (index, ref, parts, is_variable)
+        for i, ref in enumerate(refs):
+            nclass = ref.NodeClass
+            is_var = nclass == ua.NodeClass.Variable
+            if not is_var and nclass != ua.NodeClass.Object:
+                continue  # Server hat die NodeClassMask ignoriert
             try:
-                bn = await ch.read_browse_name()
-                name = bn.Name or ""
-                new_parts = path_parts + [name]
-                node_path = "/".join(new_parts)
-
-                if exclude_prefixes and any(node_path.startswith(p) for p in exclude_prefixes):
-                    continue
-
-                if include_only_prefixes:
-                    top = new_parts[0] if new_parts else ""
-                    if not any(top.startswith(p) for p in include_only_prefixes):
-                        continue
-
-                nclass = await ch.read_node_class()
-
-                if nclass == ua.NodeClass.Variable:
-                    nid = ch.nodeid
-                    if namespace_filter and (nid.NamespaceIndex not in namespace_filter):
-                        continue
-
-                    try:
-                        disp = await ch.read_display_name()
-                        display_name = disp.Text or name
-                    except Exception:
-                        display_name = name
-
-                    try:
-                        vtype = await ch.read_data_type_as_variant_type()
-                        data_type = str(vtype)
-                    except Exception:
-                        data_type = "Unknown"
-
-                    try:
-                        al = await ch.read_attribute(ua.AttributeIds.AccessLevel)
-                        access_level = int(al.Value.Value)
-                    except Exception:
-                        access_level = 0
-
-                    results.append(
-                        {
-                            "nodeId": nid.to_string(),
-                            "browsePath": new_parts,
-                            "nodePath": node_path,
-                            "displayName": display_name,
-                            "dataType": data_type,
-                            "accessLevel": access_level,
-                        }
-                    )
-
-                if nclass in (ua.NodeClass.Object, ua.NodeClass.Variable):
-                    await walk(ch, new_parts, depth + 1)
-
+                name = ref.BrowseName.Name or ""
             except Exception:
                 continue
+            new_parts = path_parts + (name,)
 
-    await walk(root, [], 0)
+            if excl and "/".join(new_parts).startswith(excl):
+                continue
+            if incl and not new_parts[0].startswith(incl):
+                continue
+            if is_var and namespace_filter and (ref.NodeId.NamespaceIndex not in namespace_filter):
+                continue
+            kept.append((i, ref, new_parts, is_var))
+
+        # DataType + AccessLevel aller übrig gebliebenen Variablen in einem Request
+        var_ids = [ref.NodeId for _, ref, _, is_var in kept if is_var]
+        attrs: List[Optional[ua.DataValue]] = []
+        if var_ids:
+            try:
+                attrs = await _read_attributes(client, var_ids, _VAR_ATTRS)
+            except Exception:
+                attrs = [None] * (2 * len(var_ids))
 
-    export = {
+        v = 0
+        for i, ref, new_parts, is_var in kept:
+            if is_var:
+                dtype, al = attrs[v], attrs[v + 1]
+                v += 2
+                name = new_parts[-1]
+                try:
+                    display_name = ref.DisplayName.Text or name
+                except Exception:
+                    display_name = name
+                if _good(dtype):
+                    data_type = await _variant_type_name(client, dtype.Value.Value, dtype_cache)
+                else:
+                    data_type = "Unknown"
+                try:
+                    access_level = int(al.Value.Value) if _good(al) else 0
+                except Exception:
+                    access_level = 0
+                rows.append((order + (i,), (ref.NodeId.to_string(), new_parts, display_name, data_type, access_level)))
+
+            if depth < max_depth:
+                queue.put_nowait((client.get_node(ref.NodeId), new_parts, order + (i,), depth + 1))
+
+    async def worker() -> None:
+        while True:
+            item = await queue.get()
+            try:
+                await visit(*item)
+            except Exception:
+                pass  # Teilbaum nicht lesbar → überspringen, Rest läuft weiter
+            finally:
+                queue.task_done()
+
+    queue.put_nowait((root, (), (), 0))
+    workers = [asyncio.create_task(worker()) for _ in range(max(1, int(concurrency)))]
+    try:
+        await queue.join()
+    finally:
+        for w in workers:
+            w.cancel()
+        await asyncio.gather(*workers, return_exceptions=True)
+
+    rows.sort(key=lambda r: r[0])
+    for _, row in rows:
+        results.append(*row)
+    return results
+
+
+def make_export(client: Client, nodes: DiscoveredNodes) -> Dict[str, Any]:
+    return {
         "version": 1,
         "generatedAt": asyncio.get_running_loop().time(),
         "endpoint": str(getattr(client, "server_url", "")),
-        "nodes": results,
+        "nodes": nodes.to_export_nodes(),
     }
-    log.info("Discovery export collected %d variables.", len(results))
-    return export
-
-
-def export_to_tags(export: Dict[str, Any]) -> Dict[str, Any]:
-    tags = {"read": [], "rw": []}
-    for n in export.get("nodes", []):
-        path = _join_path(n.get("browsePath") or [])
-        entry = {"path": path, "node": n["nodeId"], "type": n.get("dataType", "float")}
-        if _access_can_write(int(n.get("accessLevel", 0))):
-            tags["rw"].append(entry)
-        else:
-            tags["read"].append(entry)
-    return tags
+
+
+def write_export(path: str, export: Dict[str, Any]) -> None:
+    Path(os.path.dirname(path)).mkdir(parents=True, exist_ok=True)
+    # orjson serialisiert direkt nach UTF-8-Bytes (ensure_ascii=False-Äquivalent)
+    if orjson is not None:
+        with open(path, "wb") as f:
+            f.write(orjson.dumps(export, option=orjson.OPT_INDENT_2))
+        return
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(export, f, ensure_ascii=False, indent=2)
+
@@ -28,17 +28,20 @@ def _rc_to_int(reason_code) -> int:
 
 
 async def mqtt_connect_or_fail(mqtt_client: mqtt.Client, cfg: Dict[str, Any], log) -> None:
-    connected_evt = asyncio.Event()
-    result: Dict[str, Any] = {"rc": None}
+    # on_connect läuft im paho-Thread → Ergebnis per call_soon_threadsafe in den Loop
+    loop = asyncio.get_running_loop()
+    connected: "asyncio.Future[int]" = loop.create_future()
+
+    def _set_rc(rc: int) -> None:
+        if not connected.done():  # weitere CONNACKs (Reconnect) ignorieren
+            connected.set_result(rc)
 
     def on_connect(_client, _userdata, _flags, reason_code=None, properties=None, *args, **kwargs):
         # VERSION2: (client, userdata, flags, reason_code, properties)
         # defensiv: reason_code kann auch in args landen
         if reason_code is None and args:
             reason_code = args[0]
-        rc = _rc_to_int(reason_code)
-        result["rc"] = rc
-        connected_evt.set()
+        loop.call_soon_threadsafe(_set_rc, _rc_to_int(reason_code))
 
     def on_disconnect(_client, _userdata, reason_code=None, properties=None, *args, **kwargs):
         if len(args) >= 2:
@@ -58,12 +61,10 @@ async def mqtt_connect_or_fail(mqtt_client: mqtt.Client, cfg: Dict[str, Any], lo
     mqtt_client.loop_start()
 
     try:
-        await asyncio.wait_for(connected_evt.wait(), timeout=10)
+        rc = await asyncio.wait_for(connected, timeout=10)
     except asyncio.TimeoutError as e:
         raise MqttConnectError("MQTT connect timeout (no CONNACK received).") from e
 
-    rc = result["rc"]
-
     if rc == 0:
         log.info("MQTT connected to %s:%s", host, port)
         return
@@ -1,40 +1,102 @@
-from typing import Any
+import functools
+from typing import Any, Callable, Dict, Optional, Union
 
+_BOOL_TRUE = frozenset(("true", "1", "on", "yes"))
+_BOOL_FALSE = frozenset(("false", "0", "off", "no"))
+_FALLBACK_BOOL = frozenset(("true", "false", "on", "off", "1", "0"))
+_FALLBACK_TRUE = frozenset(("true", "on", "1"))
+_BOOL_TRUE_B = frozenset(v.encode() for v in _BOOL_TRUE)
+_BOOL_FALSE_B = frozenset(v.encode() for v in _BOOL_FALSE)
+
+
+# Parser bekommen den schon gestrippten Payload (str, bei Zahlen auch bytes)
+def _parse_bool(v: str) -> bool:
+    lv = v.lower()
+    if lv in _BOOL_TRUE:
+        return True
+    if lv in _BOOL_FALSE:
+        return False
+    raise ValueError(f"Invalid bool payload: {v}")
+
+
+def _parse_bool_bytes(v: bytes) -> bool:
+    # Nur ASCII-Treffer; alles andere läuft über _parse_bool (Unicode-strip, Fehlermeldung)
+    lv = bytes(v.strip().lower())  # bytearray ist nicht hashbar
+    if lv in _BOOL_TRUE_B:
+        return True
+    if lv in _BOOL_FALSE_B:
+        return False
+    raise ValueError(v)
 
-def parse_payload(payload: str, tag_type: str) -> Any:
-    v = (payload or "").strip()
-    t = (tag_type or "").strip().lower()
 
-    if t in ("bool", "boolean"):
-        if v.lower() in ("true", "1", "on", "yes"):
-            return True
-        if v.lower() in ("false", "0", "off", "no"):
-            return False
-        raise ValueError(f"Invalid bool payload: {payload}")
+def _parse_int(v: str) -> int:
+    return int(float(v))  # allow "1.0"
 
-    if t in ("int", "dint", "sint", "lint"):
-        return int(float(v))  # allow "1.0"
 
-    if t in ("uint", "udint", "usint", "ulint", "word", "dword"):
+def _make_parse_uint(tag_type: str) -> Callable[[str], int]:
+    def _parse_uint(v: str) -> int:
         n = int(float(v))
         if n < 0:
-            raise ValueError(f"Negative not allowed for unsigned type {tag_type}: {payload}")
+            raise ValueError(f"Negative not allowed for unsigned type {tag_type}: {v}")
         return n
+    return _parse_uint
 
-    if t in ("float", "real", "lreal", "double", "number"):
-        return float(v)
 
-    if t in ("string", "str"):
-        return v
+def _parse_str(v: str) -> str:
+    # datetime/date/time: we parse later (bridge.py) to support "Z"
+    return v
 
-    if t in ("datetime", "date", "time"):
-        # we parse datetime later (bridge.py) to support "Z"
-        return v
 
-    # Fallback
-    if v.lower() in ("true", "false", "on", "off", "1", "0"):
-        return v.lower() in ("true", "on", "1")
+def _parse_fallback(v: str) -> Any:
+    lv = v.lower()
+    if lv in _FALLBACK_BOOL:
+        return lv in _FALLBACK_TRUE
     try:
         return float(v)
     except Exception:
         return v
+
+
+_INT_TYPES = ("int", "dint", "sint", "lint")
+_UINT_TYPES = ("uint", "udint", "usint", "ulint", "word", "dword")
+_FLOAT_TYPES = ("float", "real", "lreal", "double", "number")
+
+# Typ-Alias → Parser, einmal beim Import aufgebaut; float direkt als Builtin
+_TYPE_PARSERS: Dict[str, Callable[[str], Any]] = {
+    "bool": _parse_bool,
+    "boolean": _parse_bool,
+    **{t: _parse_int for t in _INT_TYPES},
+    **{t: _make_parse_uint(t) for t in _UINT_TYPES},
+    **{t: float for t in _FLOAT_TYPES},
+    **{t: _parse_str for t in ("string", "str", "datetime", "date", "time")},
+}
+
+# Parser, die Bytes direkt nehmen → kein decode pro Nachricht;
+# float() nimmt Bytes inkl. ASCII-Whitespace, Zahlen brauchen daher auch kein strip
+_BYTES_PARSERS: Dict[str, Callable[[bytes], Any]] = {
+    **{t: _TYPE_PARSERS[t] for t in _INT_TYPES + _UINT_TYPES + _FLOAT_TYPES},
+    "bool": _parse_bool_bytes,
+    "boolean": _parse_bool_bytes,
+}
+
+
+def _apply(fn: Callable[[Any], Any], bytes_fn: Optional[Callable[[bytes], Any]], payload: Union[str, bytes]) -> Any:
+    if isinstance(payload, (bytes, bytearray)):
+        if bytes_fn is not None:
+            try:
+                return bytes_fn(payload)
+            except ValueError:
+                pass  # z.B. Nicht-ASCII oder negativ → unten mit Text und passender Fehlermeldung
+        payload = payload.decode("utf-8", errors="replace")
+    return fn((payload or "").strip())
+
+
+def parse_payload(payload: Union[str, bytes], tag_type: str) -> Any:
+    t = (tag_type or "").strip().lower()
+    return _apply(_TYPE_PARSERS.get(t, _parse_fallback), _BYTES_PARSERS.get(t), payload)
+
+
+def payload_parser(tag_type: str) -> Callable[[Union[str, bytes]], Any]:
+    # Typ einmal auflösen (z.B. beim Laden der Tags), danach nur noch Parsen pro Payload
+    t = (tag_type or "").strip().lower()
+    return functools.partial(_apply, _TYPE_PARSERS.get(t, _parse_fallback), _BYTES_PARSERS.get(t))
@@ -1,3 +1,4 @@
+import functools
 import os
 import subprocess
 from asyncua import ua
@@ -9,28 +10,32 @@ from asyncua.crypto.security_policies import (
 )
 
 
+_SECURITY_POLICIES = {
+    "None": SecurityPolicyNone,
+    "Basic128Rsa15": SecurityPolicyBasic128Rsa15,
+    "Basic256": SecurityPolicyBasic256,
+    "Basic256Sha256": SecurityPolicyBasic256Sha256,
+}
+
+_SECURITY_MODES = {
+    "None": ua.MessageSecurityMode.None_,
+    "Sign": ua.MessageSecurityMode.Sign,
+    "SignAndEncrypt": ua.MessageSecurityMode.SignAndEncrypt,
+}
+
+
 def map_security_policy(policy: str):
-    p = (policy or "None").strip()
-    if p == "None":
-        return SecurityPolicyNone
-    if p == "Basic128Rsa15":
-        return SecurityPolicyBasic128Rsa15
-    if p == "Basic256":
-        return SecurityPolicyBasic256
-    if p == "Basic256Sha256":
-        return SecurityPolicyBasic256Sha256
-    raise ValueError(f"Unsupported security_policy: {policy}")
+    try:
+        return _SECURITY_POLICIES[(policy or "None").strip()]
+    except KeyError:
+        raise ValueError(f"Unsupported security_policy: {policy}") from None
 
 
 def map_security_mode(mode: str):
-    m = (mode or "None").strip()
-    if m == "None":
-        return ua.MessageSecurityMode.None_
-    if m == "Sign":
-        return ua.MessageSecurityMode.Sign
-    if m == "SignAndEncrypt":
-        return ua.MessageSecurityMode.SignAndEncrypt
-    raise ValueError(f"Unsupported security_mode: {mode}")
+    try:
+        return _SECURITY_MODES[(mode or "None").strip()]
+    except KeyError:
+        raise ValueError(f"Unsupported security_mode: {mode}") from None
 
 
 def cert_contains_uri(cert_pem_path: str, app_uri: str) -> bool:
@@ -44,6 +49,9 @@ def cert_contains_uri(cert_pem_path: str, app_uri: str) -> bool:
         return False
 
 
+# Pfade ändern sich nicht → einmal bauen und das Verzeichnis einmal anlegen, nicht bei
+# jedem OPC-Reconnect; schlägt makedirs fehl, wird nichts gecacht (nächster Versuch)
+@functools.lru_cache(maxsize=None)
 def pki_paths(pki_dir: str = "/data/pki") -> dict:
     trusted_server_dir = os.path.join(pki_dir, "trusted_server")
     os.makedirs(trusted_server_dir, exist_ok=True)
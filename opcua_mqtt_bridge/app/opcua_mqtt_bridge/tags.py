@@ -1,14 +1,121 @@
-from typing import Any, Dict, List, Optional
+from typing import Any, Dict, List, Optional, Tuple
+from collections import OrderedDict
 from pathlib import Path
+import copy
+import json
+import logging
 import os
-import yaml
+
+try:
+    import orjson
+except ImportError:  # stdlib fallback
+    orjson = None
+
+log = logging.getLogger("opcua_mqtt_bridge.tags")
+
+
+def _yaml():
+    # PyYAML erst bei Bedarf importieren: mit gültigem Sidecar oder JSON-Tag-Datei
+    # startet das Add-on ohne YAML-Parser
+    import yaml
+    try:  # LibYAML (C) – deutlich schneller bei großen Tag-Dateien
+        from yaml import CSafeLoader as Loader, CSafeDumper as Dumper
+    except ImportError:
+        from yaml import SafeLoader as Loader, SafeDumper as Dumper
+    return yaml, Loader, Dumper
+
+
+def _is_json(path: str) -> bool:
+    return path.lower().endswith(".json")
+
+
+# Geparste Tag-Dateien: path -> (mtime_ns, size, data); bei jedem OPC-Reconnect wird
+# load_tags erneut aufgerufen, ohne Änderung reicht dann ein stat()
+_TAGS_CACHE: "OrderedDict[str, Tuple[int, int, Dict[str, Any]]]" = OrderedDict()
+_TAGS_CACHE_MAX = 16
+
+# JSON-Kopie der geparsten YAML für den Neustart des Add-ons (JSON lädt um Größenordnungen
+# schneller als YAML); enthält mtime/size der Quelle und gilt nur, solange die passen
+SIDECAR_DIR = "/data/tags_cache"
+
+
+def _sidecar_path(path: str) -> str:
+    return os.path.join(SIDECAR_DIR, os.path.abspath(path).strip("/").replace("/", "_") + ".json")
+
+
+def _read_sidecar(path: str, st: os.stat_result) -> Optional[Dict[str, Any]]:
+    try:
+        with open(_sidecar_path(path), "rb") as f:
+            raw = f.read()
+        cached = orjson.loads(raw) if orjson is not None else json.loads(raw)
+    except (OSError, ValueError):
+        return None
+    if cached.get("mtime_ns") != st.st_mtime_ns or cached.get("size") != st.st_size:
+        return None
+    return cached.get("data")
+
+
+def _write_sidecar(path: str, st: os.stat_result, data: Dict[str, Any]) -> None:
+    # Nur schreiben, wenn JSON die Daten exakt zurückliefert: stdlib json wirft bei date/set,
+    # macht aber still aus Nicht-String-Keys (z.B. int) Strings → Rundreise prüfen, sonst
+    # lieferte ein Warmstart andere Daten als ein Kaltstart
+    try:
+        raw = json.dumps({"mtime_ns": st.st_mtime_ns, "size": st.st_size, "data": data}, ensure_ascii=False)
+        if json.loads(raw)["data"] != data:
+            return
+        sidecar = _sidecar_path(path)
+        Path(SIDECAR_DIR).mkdir(parents=True, exist_ok=True)
+        tmp = sidecar + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            f.write(raw)
+        os.replace(tmp, sidecar)
+    except (OSError, TypeError, ValueError):
+        pass
+
+
+def _check_rw_types(path: str, data: Dict[str, Any]) -> None:
+    # type: muss ein String sein (z.B. "type: 16" in YAML ist int); nur dieser Tag fällt
+    # auf den untypisierten Parser zurück. Läuft nur beim Parsen, nicht bei Cache-Treffern
+    for tag in data.get("rw") or []:
+        t = tag.get("type", "float")
+        if t is not None and not isinstance(t, str):
+            log.error(
+                "rw tag %s in %s: type must be a string, got %r; using untyped fallback",
+                tag.get("path"), path, t,
+            )
+            tag["type"] = ""
 
 
 def load_tags(path: str) -> Dict[str, Any]:
-    with open(path, "r", encoding="utf-8") as f:
-        data = yaml.safe_load(f) or {}
-    data.setdefault("read", [])
-    data.setdefault("rw", [])
+    st = os.stat(path)
+    hit = _TAGS_CACHE.get(path)
+    if hit is not None and hit[0] == st.st_mtime_ns and hit[1] == st.st_size:
+        _TAGS_CACHE.move_to_end(path)
+        # Kopie: Aufrufer (merge_tags etc.) dürfen das Ergebnis verändern
+        return copy.deepcopy(hit[2])
+
+    if _is_json(path):
+        # Tags direkt als JSON (z.B. vorab aus YAML erzeugt) → kein YAML, kein Sidecar
+        with open(path, "rb") as f:
+            raw = f.read()
+        data = (orjson.loads(raw) if orjson is not None else json.loads(raw)) or {}
+        data.setdefault("read", [])
+        data.setdefault("rw", [])
+    else:
+        data = _read_sidecar(path, st)
+        if data is None:
+            yaml, loader, _ = _yaml()
+            with open(path, "r", encoding="utf-8") as f:
+                data = yaml.load(f, Loader=loader) or {}
+            data.setdefault("read", [])
+            data.setdefault("rw", [])
+            _write_sidecar(path, st, data)
+
+    _check_rw_types(path, data)
+    _TAGS_CACHE[path] = (st.st_mtime_ns, st.st_size, copy.deepcopy(data))
+    _TAGS_CACHE.move_to_end(path)
+    if len(_TAGS_CACHE) > _TAGS_CACHE_MAX:
+        _TAGS_CACHE.popitem(last=False)
     return data
 
 
@@ -17,25 +124,31 @@ def tags_is_empty(tags: Dict[str, Any]) -> bool:
 
 
 def write_yaml(path: str, data: Dict[str, Any]) -> None:
+    yaml, _, dumper = _yaml()
     Path(os.path.dirname(path)).mkdir(parents=True, exist_ok=True)
     with open(path, "w", encoding="utf-8") as f:
-        yaml.safe_dump(data, f, sort_keys=False, allow_unicode=True)
+        yaml.dump(data, f, Dumper=dumper, sort_keys=False, allow_unicode=True)
 
 
-def merge_tags(existing: Dict[str, Any], generated: Dict[str, Any]) -> Dict[str, Any]:
-    existing_nodes = {
-        t.get("node")
-        for t in (existing.get("read", []) + existing.get("rw", []))
-        if t.get("node")
-    }
-    out = {"read": list(existing.get("read", [])), "rw": list(existing.get("rw", []))}
+def write_tags(path: str, data: Dict[str, Any]) -> None:
+    # Format nach Dateiendung, damit load_tags die Datei wieder lesen kann
+    if not _is_json(path):
+        write_yaml(path, data)
+        return
+    Path(os.path.dirname(path)).mkdir(parents=True, exist_ok=True)
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(data, f, ensure_ascii=False, indent=2)
 
-    for e in generated.get("read", []):
-        if e.get("node") and e["node"] not in existing_nodes:
-            out["read"].append(e)
 
-    for e in generated.get("rw", []):
-        if e.get("node") and e["node"] not in existing_nodes:
-            out["rw"].append(e)
+def merge_tags(existing: Dict[str, Any], generated: Dict[str, Any]) -> Dict[str, Any]:
+    existing_read = existing.get("read", [])
+    existing_rw = existing.get("rw", [])
+    # Ohne read+rw-Konkatenation, eine Menge über beide Listen
+    existing_nodes = {t["node"] for lst in (existing_read, existing_rw) for t in lst if t.get("node")}
 
+    out = {"read": list(existing_read), "rw": list(existing_rw)}
+    for key in ("read", "rw"):
+        out[key].extend(
+            e for e in generated.get(key, []) if e.get("node") and e["node"] not in existing_nodes
+        )
     return out